@@ -23,7 +23,9 @@ from eodash_catalog.stac_handling import (
 )
 from eodash_catalog.thumbnails import generate_thumbnail
 from eodash_catalog.utils import (
+    CapabilitiesFutures,
     Options,
+    add_children_bboxes,
     create_geojson_from_bbox,
     create_geojson_point,
     filter_time_entries,
@@ -37,17 +39,57 @@ from eodash_catalog.utils import (
 
 LOGGER = get_logger(__name__)
 
+# endpoints whose extent is read from service capabilities, with the service type requested
+CAPABILITIES_SERVICE_TYPES = {
+    "rasdaman": "WCS",
+    "WMS": "WMS",
+    "marinedatastore": "WMTS",
+    # somewhat one off creation of individual WMTS layers as individual items
+    "JAXA_WMTS_PALSAR": "WMTS",
+}
+
+
+def get_capabilities_request(
+    endpoint_config: dict, service_type: str | None = None
+) -> tuple[str, str, str, str | None] | None:
+    # capabilities requested by the rasdaman and WMS/WMTS handlers, also used for prefetching
+    if service_type is None:
+        service_type = CAPABILITIES_SERVICE_TYPES.get(endpoint_config.get("Name", ""))
+    if service_type is None or (
+        service_type != "WCS"
+        and endpoint_config.get("Type") == "OverwriteTimes"
+        and endpoint_config.get("OverwriteBBox")
+    ):
+        # not read from capabilities, or times and bbox are configured
+        return None
+    if not (capabilities_url := endpoint_config.get("EndPoint")):
+        raise ValueError(f"No EndPoint defined for {service_type} resource {endpoint_config}")
+    if service_type == "WCS":
+        return capabilities_url, endpoint_config.get("Version", "2.0.1"), service_type, None
+    # some endpoints allow "narrowed-down" capabilities per-layer, which we utilize to not
+    # have to process full service capabilities XML
+    layer = None
+    if endpoint_config.get("FilterCapabilitiesByLayer", False):
+        layer = endpoint_config["LayerId"]
+    return capabilities_url, endpoint_config.get("Version", "1.1.1"), service_type, layer
+
 
 def process_WCS_rasdaman_Endpoint(
-    catalog_config: dict, endpoint_config: dict, collection_config: dict, catalog: Catalog
+    catalog_config: dict,
+    endpoint_config: dict,
+    collection_config: dict,
+    catalog: Catalog,
+    capabilities_futures: CapabilitiesFutures | None = None,
 ) -> Collection:
     collection = get_or_create_collection(
         catalog, collection_config["Name"], collection_config, catalog_config, endpoint_config
     )
+    capabilities_url, version, _, _ = get_capabilities_request(endpoint_config, "WCS")  # type: ignore
     bbox, datetimes = retrieveExtentFromWCS(
-        endpoint_config["EndPoint"],
+        capabilities_url,
         endpoint_config["CoverageId"],
-        version=endpoint_config.get("Version", "2.0.1"),
+        version=version,
+        capabilities_futures=capabilities_futures,
     )
     for dt in datetimes:
         item = Item(
@@ -65,7 +107,7 @@ def process_WCS_rasdaman_Endpoint(
     if datetimes:
         collection.update_extent_from_items()
     else:
-        LOGGER.warn(f"NO datetimes returned for collection: {endpoint_config['CoverageId']}!")
+        LOGGER.warning(f"NO datetimes returned for collection: {endpoint_config['CoverageId']}!")
 
     add_collection_information(catalog_config, collection, collection_config)
     return collection
@@ -130,7 +172,7 @@ def process_STAC_Datacube_Endpoint(
     if datetimes:
         collection.update_extent_from_items()
     else:
-        LOGGER.warn(f"NO datetimes returned for collection: {collection_id}!")
+        LOGGER.warning(f"NO datetimes returned for collection: {collection_id}!")
 
     add_collection_information(catalog_config, collection, collection_config)
 
@@ -188,10 +230,7 @@ def handle_STAC_based_endpoint(
                     ]
                 )
         root_collection.update_extent_from_items()
-        # Add bbox extents from children
-        for c_child in root_collection.get_children():
-            if isinstance(c_child, Collection):
-                root_collection.extent.spatial.bboxes.append(c_child.extent.spatial.bboxes[0])
+        add_children_bboxes(root_collection)
     else:
         bbox = None
         if "Bbox" in endpoint_config:
@@ -247,6 +286,8 @@ def process_STACAPI_Endpoint(
     # We keep track of potential duplicate times in this list
     added_times = {}
     any_item_added = False
+    # only one thumbnail is stored per collection, so it is generated from the first item
+    thumbnail_generated = False
     for item in results.items():
         any_item_added = True
         item_datetime = item.get_datetime()
@@ -259,7 +300,8 @@ def process_STACAPI_Endpoint(
                 continue
             added_times[iso_date] = True
         link = collection.add_item(item)
-        if options.tn:
+        if options.tn and not thumbnail_generated:
+            thumbnail_generated = True
             if "cog_default" in item.assets:
                 generate_thumbnail(
                     item, collection_config, endpoint_config, item.assets["cog_default"].href
@@ -311,7 +353,7 @@ def process_STACAPI_Endpoint(
     if any_item_added:
         collection.update_extent_from_items()
     else:
-        LOGGER.warn(
+        LOGGER.warning(
             f"""NO items returned for
             bbox: {bbox}, datetime: {datetime_query}, collection: {collection_id}!"""
         )
@@ -413,14 +455,13 @@ def handle_SH_WMS_endpoint(
             if location["Times"]:
                 collection.update_extent_from_items()
             else:
-                LOGGER.warn(f"NO datetimes configured for collection: {collection_config['Name']}!")
+                LOGGER.warning(
+                    f"NO datetimes configured for collection: {collection_config['Name']}!"
+                )
             add_visualization_info(collection, collection_config, endpoint_config)
 
         root_collection.update_extent_from_items()
-        # Add bbox extents from children
-        for c_child in root_collection.get_children():
-            if isinstance(c_child, Collection):
-                root_collection.extent.spatial.bboxes.append(c_child.extent.spatial.bboxes[0])
+        add_children_bboxes(root_collection)
     else:
         # if locations are not provided, treat the collection as a
         # general proxy to the sentinel hub layer
@@ -462,10 +503,14 @@ def handle_xcube_endpoint(
 
 
 def handle_rasdaman_endpoint(
-    catalog_config: dict, endpoint_config: dict, collection_config: dict, catalog: Catalog
+    catalog_config: dict,
+    endpoint_config: dict,
+    collection_config: dict,
+    catalog: Catalog,
+    capabilities_futures: CapabilitiesFutures | None = None,
 ) -> Collection:
     collection = process_WCS_rasdaman_Endpoint(
-        catalog_config, endpoint_config, collection_config, catalog
+        catalog_config, endpoint_config, collection_config, catalog, capabilities_futures
     )
     # add_example_info(collection, collection_config, endpoint_config, catalog_config)
     return collection
@@ -592,21 +637,22 @@ def handle_WMS_endpoint(
     collection_config: dict,
     catalog: Catalog,
     wmts: bool = False,
+    capabilities_futures: CapabilitiesFutures | None = None,
 ) -> Collection:
     collection = get_or_create_collection(
         catalog, collection_config["Name"], collection_config, catalog_config, endpoint_config
     )
     datetimes = get_collection_datetimes_from_config(endpoint_config)
     spatial_extent = collection.extent.spatial.to_dict().get("bbox", [-180, -90, 180, 90])[0]
-    if endpoint_config.get("Type") != "OverwriteTimes" or not endpoint_config.get("OverwriteBBox"):
-        # some endpoints allow "narrowed-down" capabilities per-layer, which we utilize to not
-        # have to process full service capabilities XML
-        capabilities_url = endpoint_config["EndPoint"]
+    if capabilities_request := get_capabilities_request(endpoint_config, "WMTS" if wmts else "WMS"):
+        capabilities_url, version, _, layer = capabilities_request
         spatial_extent, datetimes = retrieveExtentFromWMSWMTS(
             capabilities_url,
             endpoint_config["LayerId"],
-            version=endpoint_config.get("Version", "1.1.1"),
+            version=version,
             wmts=wmts,
+            filter_layer=layer is not None,
+            capabilities_futures=capabilities_futures,
         )
     # optionally filter time results
     if query := endpoint_config.get("Query"):
@@ -630,7 +676,7 @@ def handle_WMS_endpoint(
             link.extra_fields["datetime"] = format_datetime_to_isostring_zulu(dt)
         collection.update_extent_from_items()
     else:
-        LOGGER.warn(f"NO datetimes returned for collection: {collection_config['Name']}!")
+        LOGGER.warning(f"NO datetimes returned for collection: {collection_config['Name']}!")
 
     # Check if we should overwrite bbox
     if "OverwriteBBox" in endpoint_config:
@@ -707,7 +753,7 @@ def add_visualization_info(
         link = Link(
             rel="wms",
             target=f"https://services.sentinel-hub.com/ogc/wms/{instanceId}",
-            media_type=(endpoint_config.get("MimeType", "image/png")),
+            media_type=endpoint_config.get("MimeType", "image/png"),
             title=collection_config["Name"],
             extra_fields=extra_fields,
         )
@@ -936,7 +982,7 @@ def handle_custom_endpoint(
             importlib.import_module(module_name), func_name
         )
     except ModuleNotFoundError as e:
-        LOGGER.warn(
+        LOGGER.warning(
             f"""function {func_name} from module {module_name} can not be imported.
             Check if you are specifying relative path inside the
             catalog repository or catalog generator repository."""
@@ -1013,7 +1059,7 @@ def handle_raw_source(
             collection.add_link(style_link)
         collection.update_extent_from_items()
     else:
-        LOGGER.warn(f"NO datetimes configured for collection: {collection_config['Name']}!")
+        LOGGER.warning(f"NO datetimes configured for collection: {collection_config['Name']}!")
 
     add_collection_information(catalog_config, collection, collection_config)
     return collection
@@ -5,19 +5,23 @@ Indicator generator to harvest information from endpoints and generate catalog
 """
 
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import Any
 
 import click
 import yaml
 from dotenv import load_dotenv
-from pystac import Catalog, CatalogType, Collection, Link, Summaries
+from pystac import Catalog, CatalogType, Collection, Link, RelType, Summaries
 from pystac.layout import TemplateLayoutStrategy
 from pystac.validation import validate_all
 from structlog import get_logger
-from yaml.loader import SafeLoader
 
 from eodash_catalog.endpoints import (
+    CAPABILITIES_SERVICE_TYPES,
+    get_capabilities_request,
     handle_collection_only,
     handle_custom_endpoint,
     handle_GeoDB_endpoint,
@@ -35,13 +39,20 @@ from eodash_catalog.stac_handling import (
     add_extra_fields,
     add_process_info,
     add_projection_info,
+    get_child_collection,
+    get_local_markdown,
+    get_markdown_url,
     get_or_create_collection,
+    prefetch_markdown,
 )
 from eodash_catalog.utils import (
+    CapabilitiesFutures,
     Options,
-    RaisingThread,
+    SafeLoader,
+    add_children_bboxes,
     add_single_item_if_collection_empty,
     iter_len_at_least,
+    prefetch_capabilities,
     recursive_save,
     retry,
 )
@@ -51,7 +62,26 @@ load_dotenv()
 LOGGER = get_logger(__name__)
 
 
-def process_catalog_file(file_path: str, options: Options):
+@dataclass
+class CatalogBuild:
+    # state shared by the collections of one process_catalog_file call
+    # parsed collection and indicator configs, reused when processing the collections
+    configs: dict[str, dict] = field(default_factory=dict)
+    # prefetched service capabilities
+    capabilities_futures: CapabilitiesFutures = field(default_factory=dict)
+    # locks of indicators sharing a name
+    indicator_locks: dict[str, threading.Lock] = field(default_factory=dict)
+    # guards catalog level state when collections are processed concurrently
+    lock: threading.RLock = field(default_factory=threading.RLock)
+
+
+# upper bound of threads processing collections, shared by all concurrently built catalogs
+MAX_WORKERS = 32
+
+
+def process_catalog_file(
+    file_path: str, options: Options, max_collection_workers: int = MAX_WORKERS
+):
     LOGGER.info(f"Processing catalog: {file_path}")
     with open(file_path) as f:
         catalog_config: dict = yaml.load(f, Loader=SafeLoader)
@@ -75,54 +105,169 @@ def process_catalog_file(file_path: str, options: Options):
             title=catalog_config["title"],
             catalog_type=CatalogType.RELATIVE_PUBLISHED,
         )
+        if "assets_endpoint" not in catalog_config:
+            LOGGER.warning(
+                "No assets_endpoint configured, relative markdown descriptions are not fetched",
+                catalog=catalog_config["id"],
+            )
+        # fetch remote markdown descriptions and service capabilities upfront
+        # instead of one by one
+        markdown_urls: set[str] = set()
+        capabilities_requests: set[tuple[str, str, str, str | None]] = set()
+        build = CatalogBuild()
         for collection in process_collections:
-            file_path = f"{options.collectionspath}/{collection}.yaml"
-            if os.path.isfile(file_path):
-                # if collection file exists process it as indicator
-                # collection will be added as single collection to indicator
-                process_indicator_file(catalog_config, file_path, catalog, options)
-            else:
-                # if not try to see if indicator definition available
-                file_path = f"{options.indicatorspath}/{collection}.yaml"
-                if os.path.isfile(file_path):
-                    process_indicator_file(
-                        catalog_config,
-                        f"{options.indicatorspath}/{collection}.yaml",
-                        catalog,
-                        options,
-                    )
-                else:
-                    LOGGER.info(f"Warning: neither collection nor indicator found for {collection}")
-        if "MapProjection" in catalog_config:
-            catalog.extra_fields["eodash:mapProjection"] = catalog_config["MapProjection"]
-
-        strategy = TemplateLayoutStrategy(item_template="${collection}/${year}")
-        # expecting that the catalog will be hosted online, self url should correspond to that
-        # default to a local folder + catalog id in case not set
-
-        LOGGER.info("Started creation of collection files")
-        start = time.time()
-        if options.ni:
-            catalog_self_href = f'{options.outputpath}/{catalog_config["id"]}'
-            catalog.normalize_hrefs(catalog_self_href, strategy=strategy)
-            recursive_save(catalog, options.ni)
-        else:
-            # For full catalog save with items this still seems to be faster
-            catalog_self_href = catalog_config.get(
-                "endpoint", "{}/{}".format(options.outputpath, catalog_config["id"])
+            for config_path in (options.collectionspath, options.indicatorspath):
+                collect_prefetch_targets(
+                    catalog_config,
+                    f"{config_path}/{collection}.yaml",
+                    options,
+                    markdown_urls,
+                    capabilities_requests,
+                    build.configs,
+                )
+        prefetch_markdown(markdown_urls, catalog_config.get("markdown_prefetch_workers", 16))
+        prefetch_capabilities(
+            capabilities_requests,
+            build.capabilities_futures,
+            catalog_config.get("capabilities_prefetch_workers", 8),
+        )
+        try:
+            collection_workers = min(
+                catalog_config.get("collection_workers", 1), max_collection_workers
             )
-            catalog.normalize_hrefs(catalog_self_href, strategy=strategy)
-            catalog.save(dest_href="{}/{}".format(options.outputpath, catalog_config["id"]))
-        end = time.time()
-        LOGGER.info(f"Catalog {catalog_config['id']}: Time consumed in saving: {end - start}")
-
-        if options.vd:
-            # try to validate catalog if flag was set
-            LOGGER.info(f"Running validation of catalog {file_path}")
-            try:
-                validate_all(catalog.to_dict(), href=catalog_config["endpoint"])
-            except Exception as e:
-                LOGGER.info(f"Issue validation collection: {e}")
+            if collection_workers > 1:
+                with ThreadPoolExecutor(max_workers=collection_workers) as executor:
+                    indicators = list(
+                        executor.map(
+                            lambda collection: process_catalog_collection(
+                                catalog_config, collection, catalog, options, build
+                            ),
+                            process_collections,
+                        )
+                    )
+                # keep order of configured collections independent of processing time
+                restore_child_order(catalog, indicators)
+            else:
+                for collection in process_collections:
+                    process_catalog_collection(catalog_config, collection, catalog, options, build)
+            if "MapProjection" in catalog_config:
+                catalog.extra_fields["eodash:mapProjection"] = catalog_config["MapProjection"]
+
+            strategy = TemplateLayoutStrategy(item_template="${collection}/${year}")
+            # expecting that the catalog will be hosted online, self url should correspond to that
+            # default to a local folder + catalog id in case not set
+
+            LOGGER.info("Started creation of collection files")
+            start = time.time()
+            if options.ni:
+                catalog_self_href = f'{options.outputpath}/{catalog_config["id"]}'
+                catalog.normalize_hrefs(catalog_self_href, strategy=strategy)
+                recursive_save(catalog, options.ni, catalog_config.get("save_workers", 8))
+            else:
+                # For full catalog save with items this still seems to be faster
+                catalog_self_href = catalog_config.get(
+                    "endpoint", "{}/{}".format(options.outputpath, catalog_config["id"])
+                )
+                catalog.normalize_hrefs(catalog_self_href, strategy=strategy)
+                catalog.save(dest_href="{}/{}".format(options.outputpath, catalog_config["id"]))
+            end = time.time()
+            LOGGER.info(f"Catalog {catalog_config['id']}: Time consumed in saving: {end - start}")
+
+            if options.vd:
+                # try to validate catalog if flag was set
+                LOGGER.info(f"Running validation of catalog {file_path}")
+                try:
+                    validate_all(catalog.to_dict(), href=catalog_config["endpoint"])
+                except Exception as e:
+                    LOGGER.info(f"Issue validation collection: {e}")
+        finally:
+            # parsed capabilities are only kept while the catalog is built
+            build.capabilities_futures.clear()
+
+
+def process_catalog_collection(
+    catalog_config: dict,
+    collection: str,
+    catalog: Catalog,
+    options: Options,
+    build: CatalogBuild | None = None,
+) -> Collection | None:
+    file_path = f"{options.collectionspath}/{collection}.yaml"
+    if os.path.isfile(file_path):
+        # if collection file exists process it as indicator
+        # collection will be added as single collection to indicator
+        return process_indicator_file(catalog_config, file_path, catalog, options, build)
+    # if not try to see if indicator definition available
+    file_path = f"{options.indicatorspath}/{collection}.yaml"
+    if os.path.isfile(file_path):
+        return process_indicator_file(catalog_config, file_path, catalog, options, build)
+    LOGGER.info(f"Warning: neither collection nor indicator found for {collection}")
+    return None
+
+
+def restore_child_order(catalog: Catalog, indicators: list[Collection | None]) -> None:
+    positions: dict[str, int] = {}
+    for indicator in indicators:
+        if indicator is not None:
+            positions.setdefault(indicator.id, len(positions))
+    child_links = sorted(
+        (link for link in catalog.links if link.rel == RelType.CHILD),
+        key=lambda link: positions.get(link.target.id, len(positions)),
+    )
+    catalog.links = [link for link in catalog.links if link.rel != RelType.CHILD] + child_links
+
+
+def get_indicator_lock(build: CatalogBuild, name: str) -> threading.Lock:
+    with build.lock:
+        return build.indicator_locks.setdefault(name, threading.Lock())
+
+
+def load_config(file_path: str, configs: dict[str, dict] | None = None) -> dict:
+    # configs parsed while collecting prefetch targets are handed out once, handlers modify
+    # them so any further use of the same file parses it again
+    if configs and (config := configs.pop(file_path, None)) is not None:
+        return config
+    with open(file_path) as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def collect_prefetch_targets(
+    catalog_config: dict,
+    file_path: str,
+    options: Options,
+    urls: set[str],
+    capabilities_requests: set[tuple[str, str, str, str | None]],
+    configs: dict[str, dict],
+) -> None:
+    if file_path in configs or not os.path.isfile(file_path):
+        return
+    config = configs[file_path] = load_config(file_path)
+    if (
+        isinstance(description := config.get("Description"), str)
+        and get_local_markdown(description, catalog_config) is None
+        and (markdown_url := get_markdown_url(description, catalog_config))
+    ):
+        urls.add(markdown_url)
+    for endpoint_config in config.get("Resources", []):
+        try:
+            capabilities_request = get_capabilities_request(endpoint_config)
+        except ValueError:
+            # invalid resources are reported when the collection is processed
+            continue
+        if capabilities_request:
+            capabilities_requests.add(capabilities_request)
+    # follow referenced collection files of indicators and subcollections
+    referenced = list(config.get("Collections", []))
+    referenced += [sub_coll_def["Collection"] for sub_coll_def in config.get("Subcollections", [])]
+    for collection in referenced:
+        collect_prefetch_targets(
+            catalog_config,
+            f"{options.collectionspath}/{collection}.yaml",
+            options,
+            urls,
+            capabilities_requests,
+            configs,
+        )
 
 
 def extract_indicator_info(parent_collection: Collection):
@@ -164,14 +309,22 @@ def extract_indicator_info(parent_collection: Collection):
 
 
 def process_indicator_file(
-    catalog_config: dict, file_path: str, catalog: Catalog, options: Options
-):
-    with open(file_path) as f:
-        LOGGER.info(f"Processing indicator: {file_path}")
-        indicator_config: dict = yaml.load(f, Loader=SafeLoader)
-        parent_indicator = get_or_create_collection(
-            catalog, indicator_config["Name"], indicator_config, catalog_config, {}
-        )
+    catalog_config: dict,
+    file_path: str,
+    catalog: Catalog,
+    options: Options,
+    build: CatalogBuild | None = None,
+) -> Collection:
+    if build is None:
+        build = CatalogBuild()
+    LOGGER.info(f"Processing indicator: {file_path}")
+    indicator_config = load_config(file_path, build.configs)
+    # indicators sharing a name are merged into one collection, process them one after another
+    with get_indicator_lock(build, indicator_config["Name"]):
+        with build.lock:
+            parent_indicator = get_or_create_collection(
+                catalog, indicator_config["Name"], indicator_config, catalog_config, {}
+            )
         if "Collections" in indicator_config:
             for collection in indicator_config["Collections"]:
                 process_collection_file(
@@ -179,186 +332,191 @@ def process_indicator_file(
                     f"{options.collectionspath}/{collection}.yaml",
                     parent_indicator,
                     options,
+                    build,
                 )
         else:
             # we assume that collection files can also be loaded directly
-            process_collection_file(catalog_config, file_path, parent_indicator, options)
+            process_collection_file(catalog_config, file_path, parent_indicator, options, build)
         add_collection_information(catalog_config, parent_indicator, indicator_config)
         if iter_len_at_least(parent_indicator.get_items(recursive=True), 1):
             parent_indicator.update_extent_from_items()
-        # Add bbox extents from children
-        for c_child in parent_indicator.get_children():
-            if isinstance(c_child, Collection):  # typing reason
-                parent_indicator.extent.spatial.bboxes.append(c_child.extent.spatial.bboxes[0])
+        add_children_bboxes(parent_indicator)
         # extract collection information and add it to summary indicator level
         extract_indicator_info(parent_indicator)
         add_process_info(parent_indicator, catalog_config, indicator_config)
         # add baselayer and overview information to indicator collection
         add_base_overlay_info(parent_indicator, catalog_config, indicator_config)
-        add_to_catalog(parent_indicator, catalog, {}, indicator_config)
+        with build.lock:
+            add_to_catalog(parent_indicator, catalog, {}, indicator_config)
+    return parent_indicator
 
 
 @retry((Exception), tries=3, delay=5, backoff=2, logger=LOGGER)
 def process_collection_file(
-    catalog_config: dict, file_path: str, catalog: Catalog | Collection, options: Options
+    catalog_config: dict,
+    file_path: str,
+    catalog: Catalog | Collection,
+    options: Options,
+    build: CatalogBuild | None = None,
 ):
+    if build is None:
+        build = CatalogBuild()
     LOGGER.info(f"Processing collection: {file_path}")
-    with open(file_path) as f:
-        collection_config: dict = yaml.load(f, Loader=SafeLoader)
-        if "Resources" in collection_config:
-            for endpoint_config in collection_config["Resources"]:
-                try:
-                    collection = None
-                    if endpoint_config["Name"] == "Sentinel Hub":
-                        collection = handle_SH_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog, options
-                        )
-                    elif endpoint_config["Name"] == "Sentinel Hub WMS":
-                        collection = handle_SH_WMS_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog
-                        )
-                    elif endpoint_config["Name"] == "GeoDB":
-                        collection = handle_GeoDB_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog
-                        )
-                    elif endpoint_config["Name"] == "VEDA":
-                        collection = handle_VEDA_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog, options
-                        )
-                    elif endpoint_config["Name"] == "marinedatastore":
-                        collection = handle_WMS_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog, wmts=True
-                        )
-                    elif endpoint_config["Name"] == "xcube":
-                        collection = handle_xcube_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog
-                        )
-                    elif endpoint_config["Name"] == "rasdaman":
-                        collection = handle_rasdaman_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog
-                        )
-                    elif endpoint_config["Name"] == "WMS":
-                        collection = handle_WMS_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog
-                        )
-                    elif endpoint_config["Name"] == "JAXA_WMTS_PALSAR":
-                        # somewhat one off creation of individual WMTS layers as individual items
-                        collection = handle_WMS_endpoint(
-                            catalog_config, endpoint_config, collection_config, catalog, wmts=True
-                        )
-                    elif endpoint_config["Name"] == "Collection-only":
-                        collection = handle_collection_only(
-                            catalog_config, endpoint_config, collection_config, catalog
-                        )
-                    elif endpoint_config["Name"] == "Custom-Endpoint":
-                        collection = handle_custom_endpoint(
-                            catalog_config,
-                            endpoint_config,
-                            collection_config,
-                            catalog,
-                        )
-                    elif endpoint_config["Name"] in [
-                        "COG source",
-                        "GeoJSON source",
-                        "FlatGeobuf source",
-                    ]:
-                        collection = handle_raw_source(
-                            catalog_config, endpoint_config, collection_config, catalog
-                        )
-                    else:
-                        raise ValueError("Type of Resource is not supported")
-                    if collection:
-                        add_single_item_if_collection_empty(collection)
-                        add_projection_info(endpoint_config, collection)
-                        add_to_catalog(collection, catalog, endpoint_config, collection_config)
-                    else:
-                        raise Exception(
-                            f"No collection was generated for resource {endpoint_config}"
-                        )
-                except Exception as e:
-                    LOGGER.warn(f"""Exception: {e.args[0]} with config: {endpoint_config}""")
-                    raise e
-
-        elif "Subcollections" in collection_config:
-            # if no endpoint is specified we check for definition of subcollections
-            parent_collection = get_or_create_collection(
-                catalog, collection_config["Name"], collection_config, catalog_config, {}
-            )
-
-            locations = []
-            countries = []
-            for sub_coll_def in collection_config["Subcollections"]:
-                # Subcollection has only data on one location which
-                # is defined for the entire collection
-                if "Name" in sub_coll_def and "Point" in sub_coll_def:
-                    locations.append(sub_coll_def["Name"])
-                    if isinstance(sub_coll_def["Country"], list):
-                        countries.extend(sub_coll_def["Country"])
-                    else:
-                        countries.append(sub_coll_def["Country"])
-                    process_collection_file(
+    collection_config = load_config(file_path, build.configs)
+    if "Resources" in collection_config:
+        for endpoint_config in collection_config["Resources"]:
+            try:
+                collection = None
+                if endpoint_config["Name"] == "Sentinel Hub":
+                    collection = handle_SH_endpoint(
+                        catalog_config, endpoint_config, collection_config, catalog, options
+                    )
+                elif endpoint_config["Name"] == "Sentinel Hub WMS":
+                    collection = handle_SH_WMS_endpoint(
+                        catalog_config, endpoint_config, collection_config, catalog
+                    )
+                elif endpoint_config["Name"] == "GeoDB":
+                    collection = handle_GeoDB_endpoint(
+                        catalog_config, endpoint_config, collection_config, catalog
+                    )
+                elif endpoint_config["Name"] == "VEDA":
+                    collection = handle_VEDA_endpoint(
+                        catalog_config, endpoint_config, collection_config, catalog, options
+                    )
+                elif endpoint_config["Name"] == "xcube":
+                    collection = handle_xcube_endpoint(
+                        catalog_config, endpoint_config, collection_config, catalog
+                    )
+                elif endpoint_config["Name"] == "rasdaman":
+                    collection = handle_rasdaman_endpoint(
                         catalog_config,
-                        "{}/{}.yaml".format(options.collectionspath, sub_coll_def["Collection"]),
-                        parent_collection,
-                        options,
+                        endpoint_config,
+                        collection_config,
+                        catalog,
+                        build.capabilities_futures,
                     )
-                    # find link in parent collection to update metadata
-                    for link in parent_collection.links:
-                        if (
-                            link.rel == "child"
-                            and "id" in link.extra_fields
-                            and link.extra_fields["id"] == sub_coll_def["Identifier"]
-                        ):
-                            latlng = "{},{}".format(
-                                sub_coll_def["Point"][1],
-                                sub_coll_def["Point"][0],
-                            )
-                            link.extra_fields["id"] = sub_coll_def["Identifier"]
-                            link.extra_fields["latlng"] = latlng
-                            link.extra_fields["name"] = sub_coll_def["Name"]
-                    # Update title of collection to use location name
-                    sub_collection = parent_collection.get_child(id=sub_coll_def["Identifier"])
-                    if sub_collection:
-                        sub_collection.title = sub_coll_def["Name"]
-                # The subcollection has multiple locations which need to be extracted
-                # and elevated to parent collection level
-                else:
-                    # create temp catalog to save collection
-                    tmp_catalog = Catalog(id="tmp_catalog", description="temp catalog placeholder")
-                    process_collection_file(
+                elif (service_type := CAPABILITIES_SERVICE_TYPES.get(endpoint_config["Name"])) in (
+                    "WMS",
+                    "WMTS",
+                ):
+                    collection = handle_WMS_endpoint(
                         catalog_config,
-                        "{}/{}.yaml".format(options.collectionspath, sub_coll_def["Collection"]),
-                        tmp_catalog,
-                        options,
+                        endpoint_config,
+                        collection_config,
+                        catalog,
+                        wmts=service_type == "WMTS",
+                        capabilities_futures=build.capabilities_futures,
                     )
-                    links = tmp_catalog.get_child(sub_coll_def["Identifier"]).get_links()  # type: ignore
-                    for link in links:
-                        # extract summary information
-                        if "city" in link.extra_fields:
-                            locations.append(link.extra_fields["city"])
-                        if "country" in link.extra_fields:
-                            if isinstance(link.extra_fields["country"], list):
-                                countries.extend(link.extra_fields["country"])
-                            else:
-                                countries.append(link.extra_fields["country"])
-
-                    parent_collection.add_links(links)
-
-            add_collection_information(catalog_config, parent_collection, collection_config)
-            add_process_info(catalog_config, parent_collection, collection_config)
-            parent_collection.update_extent_from_items()
-            # Add bbox extents from children
-            for c_child in parent_collection.get_children():
-                if isinstance(c_child, Collection):
-                    parent_collection.extent.spatial.bboxes.append(c_child.extent.spatial.bboxes[0])
-            # Fill summaries for locations
-            parent_collection.summaries = Summaries(
-                {
-                    "cities": list(set(locations)),
-                    "countries": list(set(countries)),
-                }
-            )
-            add_to_catalog(parent_collection, catalog, {}, collection_config)
+                elif endpoint_config["Name"] == "Collection-only":
+                    collection = handle_collection_only(
+                        catalog_config, endpoint_config, collection_config, catalog
+                    )
+                elif endpoint_config["Name"] == "Custom-Endpoint":
+                    collection = handle_custom_endpoint(
+                        catalog_config,
+                        endpoint_config,
+                        collection_config,
+                        catalog,
+                    )
+                elif endpoint_config["Name"] in [
+                    "COG source",
+                    "GeoJSON source",
+                    "FlatGeobuf source",
+                ]:
+                    collection = handle_raw_source(
+                        catalog_config, endpoint_config, collection_config, catalog
+                    )
+                else:
+                    raise ValueError("Type of Resource is not supported")
+                if collection:
+                    add_single_item_if_collection_empty(collection)
+                    add_projection_info(endpoint_config, collection)
+                    add_to_catalog(collection, catalog, endpoint_config, collection_config)
+                else:
+                    raise Exception(f"No collection was generated for resource {endpoint_config}")
+            except Exception as e:
+                LOGGER.warning(f"""Exception: {e.args[0]} with config: {endpoint_config}""")
+                raise e
+
+    elif "Subcollections" in collection_config:
+        # if no endpoint is specified we check for definition of subcollections
+        parent_collection = get_or_create_collection(
+            catalog, collection_config["Name"], collection_config, catalog_config, {}
+        )
+
+        locations = []
+        countries = []
+        for sub_coll_def in collection_config["Subcollections"]:
+            # Subcollection has only data on one location which
+            # is defined for the entire collection
+            if "Name" in sub_coll_def and "Point" in sub_coll_def:
+                locations.append(sub_coll_def["Name"])
+                if isinstance(sub_coll_def["Country"], list):
+                    countries.extend(sub_coll_def["Country"])
+                else:
+                    countries.append(sub_coll_def["Country"])
+                process_collection_file(
+                    catalog_config,
+                    "{}/{}.yaml".format(options.collectionspath, sub_coll_def["Collection"]),
+                    parent_collection,
+                    options,
+                    build,
+                )
+                # find link in parent collection to update metadata
+                for link in parent_collection.links:
+                    if (
+                        link.rel == "child"
+                        and "id" in link.extra_fields
+                        and link.extra_fields["id"] == sub_coll_def["Identifier"]
+                    ):
+                        latlng = "{},{}".format(
+                            sub_coll_def["Point"][1],
+                            sub_coll_def["Point"][0],
+                        )
+                        link.extra_fields["id"] = sub_coll_def["Identifier"]
+                        link.extra_fields["latlng"] = latlng
+                        link.extra_fields["name"] = sub_coll_def["Name"]
+                # Update title of collection to use location name
+                sub_collection = parent_collection.get_child(id=sub_coll_def["Identifier"])
+                if sub_collection:
+                    sub_collection.title = sub_coll_def["Name"]
+            # The subcollection has multiple locations which need to be extracted
+            # and elevated to parent collection level
+            else:
+                # create temp catalog to save collection
+                tmp_catalog = Catalog(id="tmp_catalog", description="temp catalog placeholder")
+                process_collection_file(
+                    catalog_config,
+                    "{}/{}.yaml".format(options.collectionspath, sub_coll_def["Collection"]),
+                    tmp_catalog,
+                    options,
+                    build,
+                )
+                links = tmp_catalog.get_child(sub_coll_def["Identifier"]).get_links()  # type: ignore
+                for link in links:
+                    # extract summary information
+                    if "city" in link.extra_fields:
+                        locations.append(link.extra_fields["city"])
+                    if "country" in link.extra_fields:
+                        if isinstance(link.extra_fields["country"], list):
+                            countries.extend(link.extra_fields["country"])
+                        else:
+                            countries.append(link.extra_fields["country"])
+
+                parent_collection.add_links(links)
+
+        add_collection_information(catalog_config, parent_collection, collection_config)
+        add_process_info(catalog_config, parent_collection, collection_config)
+        parent_collection.update_extent_from_items()
+        add_children_bboxes(parent_collection)
+        # Fill summaries for locations
+        parent_collection.summaries = Summaries(
+            {
+                "cities": list(set(locations)),
+                "countries": list(set(countries)),
+            }
+        )
+        add_to_catalog(parent_collection, catalog, {}, collection_config)
 
 
 def add_to_catalog(
@@ -366,9 +524,8 @@ def add_to_catalog(
 ):
     # check if already in catalog, if it is do not re-add it
     # TODO: probably we should add to the catalog only when creating
-    for cat_coll in catalog.get_collections():
-        if cat_coll.id == collection.id:
-            return
+    if get_child_collection(catalog, collection.id):
+        return
 
     link: Link = catalog.add_child(collection)
     # bubble fields we want to have up to collection link and add them to collection
@@ -470,13 +627,20 @@ def process_catalogs(
         tn=tn,
         collections=collections,
     )
-    tasks = []
-    for file_name in os.listdir(catalogspath):
-        file_path = f"{catalogspath}/{file_name}"
-        if os.path.isfile(file_path) and (
-            catalog is None or os.path.splitext(file_name)[0] == catalog
-        ):
-            tasks.append(RaisingThread(target=process_catalog_file, args=(file_path, options)))
-            tasks[-1].start()
-    for task in tasks:
-        task.join()
+    file_paths = [
+        f"{catalogspath}/{file_name}"
+        for file_name in os.listdir(catalogspath)
+        if os.path.isfile(f"{catalogspath}/{file_name}")
+        and (catalog is None or os.path.splitext(file_name)[0] == catalog)
+    ]
+    catalog_workers = max(1, min(len(file_paths), MAX_WORKERS))
+    # catalogs built concurrently share the collection worker budget
+    max_collection_workers = max(1, MAX_WORKERS // catalog_workers)
+    with ThreadPoolExecutor(max_workers=catalog_workers) as executor:
+        tasks = [
+            executor.submit(process_catalog_file, file_path, options, max_collection_workers)
+            for file_path in file_paths
+        ]
+        # raise errors of failed catalogs once all submitted catalogs are done
+        for task in tasks:
+            task.result()
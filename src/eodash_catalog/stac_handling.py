@@ -1,4 +1,14 @@
-from datetime import datetime
+import copy
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from functools import lru_cache
+from weakref import WeakKeyDictionary
 
 import requests
 import spdx_lookup as lookup
@@ -11,19 +21,210 @@ from pystac import (
     Item,
     Link,
     Provider,
+    RelType,
     SpatialExtent,
     TemporalExtent,
 )
+from requests.adapters import HTTPAdapter
 from structlog import get_logger
-from yaml.loader import SafeLoader
+from urllib3.util.retry import Retry
 
 from eodash_catalog.utils import (
+    SafeLoader,
     generateDatetimesFromInterval,
     get_full_url,
+    getDatetimeBoundsFromInterval,
     parse_datestring_to_tz_aware_datetime,
 )
 
 LOGGER = get_logger(__name__)
+# shared session to reuse connections when fetching remote resources, the pool is sized
+# for the concurrent markdown prefetch so connections are kept alive between collections
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=16, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.2)
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+# connect and read timeout in seconds for markdown requests
+_MARKDOWN_TIMEOUT = (5, 15)
+# upper bound of bytes read from a markdown description
+_MARKDOWN_MAX_BYTES = 2_000_000
+# pending markdown downloads started by prefetch_markdown, keyed by url
+_MARKDOWN_FUTURES: dict[str, Future[str]] = {}
+_MARKDOWN_PREFETCH_TIMEOUT = 50
+# child collections by id per catalog, together with the indexed links list, the number of
+# links already indexed and the last indexed link
+_CHILD_COLLECTION_INDEX: WeakKeyDictionary[
+    Catalog, tuple[dict[str, Collection], list[Link], int, Link | None]
+] = WeakKeyDictionary()
+
+
+def get_session() -> requests.Session:
+    return _SESSION
+
+
+def set_session(session: requests.Session) -> None:
+    global _SESSION
+    _SESSION = session
+    _MARKDOWN_FUTURES.clear()
+    _fetch_markdown.cache_clear()
+
+
+def _get_markdown_cache_path(url: str) -> str | None:
+    # optional on-disk cache directory, lets repeated builds revalidate instead of downloading
+    if cache_dir := os.getenv("EODASH_HTTP_CACHE"):
+        return os.path.join(cache_dir, f"{hashlib.sha256(url.encode()).hexdigest()}.json")
+    return None
+
+
+def _read_markdown_cache(cache_path: str) -> dict | None:
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_markdown_cache(cache_path: str, entry: dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump(entry, f)
+    except OSError as e:
+        LOGGER.warning("Markdown cache could not be written", path=cache_path, error=str(e))
+
+
+@lru_cache(maxsize=512)
+def _fetch_markdown(url: str) -> str:
+    # markdown descriptions are often shared between collections, fetch each only once,
+    # failed requests raise and are therefore not cached
+    cache_path = _get_markdown_cache_path(url)
+    cached = _read_markdown_cache(cache_path) if cache_path else None
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    with _SESSION.get(url, headers=headers, timeout=_MARKDOWN_TIMEOUT, stream=True) as response:
+        if cached and response.status_code == 304:
+            return cached["text"]
+        if response.status_code != 200:
+            raise requests.HTTPError(
+                f"Markdown request returned status {response.status_code}", response=response
+            )
+        content = response.raw.read(_MARKDOWN_MAX_BYTES, decode_content=True)
+        if len(content) == _MARKDOWN_MAX_BYTES and response.raw.read(1, decode_content=True):
+            LOGGER.warning(
+                "Markdown file exceeds size limit and was truncated",
+                url=url,
+                limit=_MARKDOWN_MAX_BYTES,
+            )
+        # markdown is utf-8, decode directly instead of letting requests guess the encoding,
+        # a character split by the size limit is replaced
+        text = content.decode("utf-8", errors="replace")
+    if cache_path:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            _write_markdown_cache(
+                cache_path, {"etag": etag, "last_modified": last_modified, "text": text}
+            )
+    return text
+
+
+@lru_cache(maxsize=32)
+def _load_layers_yaml(path: str, mtime: float) -> list[dict]:
+    # default layer definitions are the same for all collections, parse them only once
+    # per modification of the file
+    with open(path) as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def get_markdown_url(description: str, catalog_config: dict) -> str | None:
+    if not description.lower().endswith(".md"):
+        return None
+    if description.startswith("http"):
+        # if full absolute path is defined
+        return description
+    # relative path to assets was given
+    # catalogs without assets_endpoint are reported once by process_catalog_file
+    assets_endpoint = catalog_config.get("assets_endpoint")
+    if assets_endpoint is None:
+        return None
+    return f"{assets_endpoint}/{description}"
+
+
+def get_local_markdown(description: str, catalog_config: dict) -> str | None:
+    # markdown shipped together with the catalog configuration can be read without a request
+    local_assets_root = catalog_config.get("local_assets_root")
+    if (
+        local_assets_root
+        and description.lower().endswith(".md")
+        and not description.startswith("http")
+    ):
+        return _read_text_file(os.path.join(local_assets_root, description))
+    return None
+
+
+@lru_cache(maxsize=512)
+def _read_text_file(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def prefetch_markdown(urls: Iterable[str], workers: int = 16) -> None:
+    # start downloading markdown files in the background, get_or_create_collection picks up
+    # the results so collections can already be processed while requests are in flight
+    executor = ThreadPoolExecutor(max_workers=workers)
+    for url in set(urls):
+        if url not in _MARKDOWN_FUTURES:
+            _MARKDOWN_FUTURES[url] = executor.submit(_fetch_markdown, url)
+    executor.shutdown(wait=False)
+
+
+def _get_markdown(url: str) -> str | None:
+    if future := _MARKDOWN_FUTURES.pop(url, None):
+        try:
+            return future.result(timeout=_MARKDOWN_PREFETCH_TIMEOUT)
+        except FutureTimeoutError:
+            # the prefetch request is still running, do not start a second one
+            LOGGER.warning("Markdown file could not be prefetched in time", url=url)
+            return None
+        except requests.HTTPError:
+            return None
+        except Exception as e:
+            LOGGER.warning("Markdown file could not be prefetched", url=url, error=str(e))
+    try:
+        return _fetch_markdown(url)
+    except requests.HTTPError:
+        return None
+
+
+def get_child_collection(catalog: Catalog, collection_id: str) -> Collection | None:
+    links = catalog.links
+    index, indexed_list, indexed_links, last_link = _CHILD_COLLECTION_INDEX.get(
+        catalog, ({}, links, 0, None)
+    )
+    if (
+        indexed_list is not links
+        or indexed_links > len(links)
+        or (indexed_links and links[indexed_links - 1] is not last_link)
+    ):
+        # links have been replaced or removed, index needs to be rebuilt
+        index, indexed_links = {}, 0
+    # only links added since the last lookup need to be indexed
+    for link in links[indexed_links:]:
+        if link.rel == RelType.CHILD:
+            child = link.resolve_stac_object(root=catalog.get_root()).target
+            if isinstance(child, Collection):
+                index.setdefault(child.id, child)
+    _CHILD_COLLECTION_INDEX[catalog] = (index, links, len(links), links[-1] if links else None)
+    return index.get(collection_id)
 
 
 def get_or_create_collection(
@@ -34,58 +235,51 @@ def get_or_create_collection(
     endpoint_config: dict,
 ) -> Collection:
     # Check if collection already in catalog
-    for collection in catalog.get_collections():
-        if collection.id == collection_id:
-            return collection
+    if existing_collection := get_child_collection(catalog, collection_id):
+        return existing_collection
     # If none found create a new one
-    spatial_extent = endpoint_config.get("OverwriteBBox", [-180.0, -90.0, 180.0, 90.0])
-
-    spatial_extent = SpatialExtent(
-        [
-            spatial_extent,
-        ]
-    )
-    temporal_extent = TemporalExtent([[datetime.now(), None]])
+    temporal_extent = None
     if endpoint_config:
-        times_datetimes = get_collection_datetimes_from_config(endpoint_config)
-        if len(times_datetimes) > 0:
-            temporal_extent = TemporalExtent([[times_datetimes[0], times_datetimes[-1]]])
-
-    extent = Extent(spatial=spatial_extent, temporal=temporal_extent)
-
-    # Check if description is link to markdown file
-    if "Description" in collection_config:
-        description = collection_config["Description"]
-        if description.endswith((".md", ".MD")):
-            if description.startswith("http"):
-                # if full absolute path is defined
-                response = requests.get(description)
-                if response.status_code == 200:
-                    description = response.text
-                elif "Subtitle" in collection_config:
-                    LOGGER.warn("Markdown file could not be fetched")
-                    description = collection_config["Subtitle"]
-            else:
-                # relative path to assets was given
-                response = requests.get(f'{catalog_config["assets_endpoint"]}/{description}')
-                if response.status_code == 200:
-                    description = response.text
-                elif "Subtitle" in collection_config:
-                    LOGGER.warn("Markdown file could not be fetched")
-                    description = collection_config["Subtitle"]
-    elif "Subtitle" in collection_config:
-        # Try to use at least subtitle to fill some information
-        description = collection_config["Subtitle"]
+        datetime_bounds = get_collection_datetime_bounds(endpoint_config)
+        if datetime_bounds:
+            temporal_extent = TemporalExtent([datetime_bounds])
+    if temporal_extent is None:
+        temporal_extent = TemporalExtent([[datetime.now(tz=timezone.utc), None]])
+
+    extent = Extent(
+        spatial=SpatialExtent([endpoint_config.get("OverwriteBBox", [-180.0, -90.0, 180.0, 90.0])]),
+        temporal=temporal_extent,
+    )
 
     collection = Collection(
         id=collection_id,
         title=collection_config["Title"],
-        description=description,
+        description=_get_description(collection_config, catalog_config),
         extent=extent,
     )
     return collection
 
 
+def _get_description(collection_config: dict, catalog_config: dict) -> str:
+    description = collection_config.get("Description")
+    if description is None:
+        # Try to use at least subtitle to fill some information
+        return collection_config.get("Subtitle", "")
+    if description[-3:].lower() != ".md":
+        # inline description, the common case
+        return description
+    # description is link to markdown file
+    if (local_markdown := get_local_markdown(description, catalog_config)) is not None:
+        return local_markdown
+    if markdown_url := get_markdown_url(description, catalog_config):
+        if (text := _get_markdown(markdown_url)) is not None:
+            return text
+        if "Subtitle" in collection_config:
+            LOGGER.warning("Markdown file could not be fetched", url=markdown_url)
+            return collection_config["Subtitle"]
+    return description
+
+
 def create_service_link(endpoint_config: dict, catalog_config: dict) -> Link:
     extra_fields = {
         "id": endpoint_config["Identifier"],
@@ -106,41 +300,150 @@ def create_service_link(endpoint_config: dict, catalog_config: dict) -> Link:
     return sl
 
 
-def create_web_map_link(layer_config: dict, role: str) -> Link:
+def _get_web_map_link_roles(layer_config: dict, role: str) -> list[str]:
+    roles = [role]
+    if layer_config.get("default"):
+        roles.append("default")
+    if "visible" in layer_config:
+        roles.append("visible" if layer_config["visible"] else "invisible")
+    return roles
+
+
+def _get_wms_fields(layer_config: dict) -> dict:
+    # handle wms special config options
+    fields = {"wms:layers": layer_config["layers"]}
+    if "styles" in layer_config:
+        fields["wms:styles"] = layer_config["styles"]
+    if "dimensions" in layer_config:
+        fields["wms:dimensions"] = layer_config["dimensions"]
+    return fields
+
+
+def _get_wmts_fields(layer_config: dict) -> dict:
+    fields = {"wmts:layer": layer_config["layer"]}
+    if "dimensions" in layer_config:
+        fields["wmts:dimensions"] = layer_config["dimensions"]
+    return fields
+
+
+# protocol specific extra fields of web map links
+_WEB_MAP_PROTOCOL_FIELDS: dict[str, Callable[[dict], dict]] = {
+    "wms": _get_wms_fields,
+    "wmts": _get_wmts_fields,
+}
+
+
+def _build_web_map_link_kwargs(layer_config: dict, role: str) -> dict:
     extra_fields = {
-        "roles": [role],
+        "roles": _get_web_map_link_roles(layer_config, role),
         "id": layer_config["id"],
     }
-    if layer_config.get("default"):
-        extra_fields["roles"].append("default")
-    if layer_config.get("visible"):
-        extra_fields["roles"].append("visible")
-    if "visible" in layer_config and not layer_config["visible"]:
-        extra_fields["roles"].append("invisible")
-
-    match layer_config["protocol"].lower():
-        case "wms":
-            # handle wms special config options
-            extra_fields["wms:layers"] = layer_config["layers"]
-            if "styles" in layer_config:
-                extra_fields["wms:styles"] = layer_config["styles"]
-            if "dimensions" in layer_config:
-                extra_fields["wms:dimensions"] = layer_config["dimensions"]
-        case "wmts":
-            extra_fields["wmts:layer"] = layer_config["layer"]
-            if "dimensions" in layer_config:
-                extra_fields["wmts:dimensions"] = layer_config["dimensions"]
+    protocol = layer_config["protocol"]
+    # protocols are mostly configured in lower case already
+    get_protocol_fields = _WEB_MAP_PROTOCOL_FIELDS.get(protocol)
+    if get_protocol_fields is None:
+        get_protocol_fields = _WEB_MAP_PROTOCOL_FIELDS.get(protocol.lower())
+    if get_protocol_fields:
+        extra_fields.update(get_protocol_fields(layer_config))
     if "Attribution" in layer_config:
         extra_fields["attribution"] = layer_config["Attribution"]
-    wml = Link(
-        rel=layer_config["protocol"],
-        target=layer_config["url"],
-        media_type=layer_config.get("media_type", "image/png"),
-        title=layer_config["name"],
-        extra_fields=extra_fields,
+    _add_projection_fields(layer_config, extra_fields)
+    return {
+        "rel": protocol,
+        "target": layer_config["url"],
+        "media_type": layer_config.get("media_type", "image/png"),
+        "title": layer_config["name"],
+        "extra_fields": extra_fields,
+    }
+
+
+def _make_link(link_kwargs: dict) -> Link:
+    # links are owned by a single parent, so each one gets its own copy of extra fields,
+    # including nested values like wms:dimensions
+    extra_fields = copy.deepcopy(link_kwargs["extra_fields"])
+    return Link(**{**link_kwargs, "extra_fields": extra_fields})
+
+
+@lru_cache(maxsize=32)
+def _get_default_web_map_links_kwargs(path: str, mtime: float, role: str) -> list[dict]:
+    return [_build_web_map_link_kwargs(layer, role) for layer in _load_layers_yaml(path, mtime)]
+
+
+def _get_default_web_map_links(path: str, role: str) -> list[Link]:
+    link_kwargs = _get_default_web_map_links_kwargs(path, os.path.getmtime(path), role)
+    return [_make_link(kw) for kw in link_kwargs]
+
+
+def create_web_map_link(layer_config: dict, role: str) -> Link:
+    return Link(**_build_web_map_link_kwargs(layer_config, role))
+
+
+def _make_statistical_api_link(service: dict, endpoint_config: dict, catalog_config: dict) -> Link:
+    service_type = service.get("Type", "byoc")
+    return Link(
+        rel="example",
+        target=f'{catalog_config["assets_endpoint"]}/{service["Script"]}',
+        title="evalscript",
+        media_type="application/javascript",
+        extra_fields={
+            "example:language": "JavaScript",
+            "dataId": f'{service_type}-{service["CollectionId"]}',
+        },
+    )
+
+
+def _make_veda_statistics_link(service: dict, endpoint_config: dict, catalog_config: dict) -> Link:
+    return Link(
+        rel="example",
+        target=service["Endpoint"],
+        title=service["Name"],
+        media_type="application/json",
+        extra_fields={
+            "example:language": "JSON",
+        },
     )
-    add_projection_info(layer_config, wml)
-    return wml
+
+
+def _make_eoxhub_notebook_link(service: dict, endpoint_config: dict, catalog_config: dict) -> Link:
+    # TODO: we need to consider if we can improve information added
+    return Link(
+        rel="example",
+        target=service["Url"],
+        title=(service["Title"] if "Title" in service else service["Name"]),
+        media_type="application/x-ipynb+json",
+        extra_fields={
+            "example:language": "Jupyter Notebook",
+            "example:container": True,
+        },
+    )
+
+
+def _make_xcube_link(service: dict, endpoint_config: dict, catalog_config: dict) -> Link:
+    target_url = (
+        f'{endpoint_config["EndPoint"]}/timeseries/'
+        f'{endpoint_config["DatacubeId"]}/{endpoint_config["Variable"]}?aggMethods=median'
+    )
+    return Link(
+        rel="example",
+        target=target_url,
+        title=service["Name"] + " analytics",
+        media_type="application/json",
+        extra_fields={
+            "example:language": "JSON",
+            "example:method": "POST",
+        },
+    )
+
+
+_SERVICE_HANDLERS: dict[str, Callable[[dict, dict, dict], Link]] = {
+    "Statistical API": _make_statistical_api_link,
+    "VEDA Statistics": _make_veda_statistics_link,
+    "EOxHub Notebook": _make_eoxhub_notebook_link,
+}
+
+_RESOURCE_HANDLERS: dict[str, Callable[[dict, dict, dict], Link]] = {
+    "xcube": _make_xcube_link,
+}
 
 
 def add_example_info(
@@ -150,178 +453,126 @@ def add_example_info(
     catalog_config: dict,
 ) -> None:
     if "Services" in collection_config:
-        for service in collection_config["Services"]:
-            if service["Name"] == "Statistical API":
-                service_type = service.get("Type", "byoc")
-                stac_object.add_link(
-                    Link(
-                        rel="example",
-                        target="{}/{}".format(catalog_config["assets_endpoint"], service["Script"]),
-                        title="evalscript",
-                        media_type="application/javascript",
-                        extra_fields={
-                            "example:language": "JavaScript",
-                            "dataId": "{}-{}".format(service_type, service["CollectionId"]),
-                        },
-                    )
-                )
-            if service["Name"] == "VEDA Statistics":
-                stac_object.add_link(
-                    Link(
-                        rel="example",
-                        target=service["Endpoint"],
-                        title=service["Name"],
-                        media_type="application/json",
-                        extra_fields={
-                            "example:language": "JSON",
-                        },
-                    )
-                )
-            if service["Name"] == "EOxHub Notebook":
-                # TODO: we need to consider if we can improve information added
-                stac_object.add_link(
-                    Link(
-                        rel="example",
-                        target=service["Url"],
-                        title=(service["Title"] if "Title" in service else service["Name"]),
-                        media_type="application/x-ipynb+json",
-                        extra_fields={
-                            "example:language": "Jupyter Notebook",
-                            "example:container": True,
-                        },
-                    )
-                )
+        services, handlers = collection_config["Services"], _SERVICE_HANDLERS
     elif "Resources" in collection_config:
-        for service in collection_config["Resources"]:
-            if service.get("Name") == "xcube":
-                target_url = "{}/timeseries/{}/{}?aggMethods=median".format(
-                    endpoint_config["EndPoint"],
-                    endpoint_config["DatacubeId"],
-                    endpoint_config["Variable"],
-                )
-                stac_object.add_link(
-                    Link(
-                        rel="example",
-                        target=target_url,
-                        title=service["Name"] + " analytics",
-                        media_type="application/json",
-                        extra_fields={
-                            "example:language": "JSON",
-                            "example:method": "POST",
-                        },
-                    )
-                )
+        services, handlers = collection_config["Resources"], _RESOURCE_HANDLERS
+    else:
+        return
+    for service in services:
+        if handler := handlers.get(service.get("Name")):
+            stac_object.add_link(handler(service, endpoint_config, catalog_config))
+
+
+@lru_cache(maxsize=1024)
+def _spdx_by_id(license_id: str) -> tuple[str, tuple[str, ...]] | None:
+    # the spdx license list is static, scanning it once per distinct id is enough
+    license_data = lookup.by_id(license_id)
+    if license_data is None:
+        return None
+    return license_data.id, tuple(license_data.sources or ())
 
 
 def add_collection_information(
     catalog_config: dict, collection: Collection, collection_config: dict
 ) -> None:
+    assets_endpoint = catalog_config.get("assets_endpoint", "")
+    extra_fields = collection.extra_fields
     # Add metadata information
     # Check license identifier
-    if "License" in collection_config:
+    if (license_config := collection_config.get("License")) is not None:
         # Check if list was provided
-        if isinstance(collection_config["License"], list):
-            if len(collection_config["License"]) == 1:
+        if isinstance(license_config, list):
+            if len(license_config) == 1:
                 collection.license = "proprietary"
-                link = Link(
+            elif len(license_config) > 1:
+                collection.license = "various"
+            collection.links.extend(
+                Link(
                     rel="license",
-                    target=collection_config["License"][0]["Url"],
-                    media_type=(collection_config["License"][0].get("Type", "text/html")),
+                    target=license_entry["Url"],
+                    media_type=license_entry.get("Type", "text/html"),
+                    title=license_entry.get("Title"),
                 )
-                if "Title" in collection_config["License"][0]:
-                    link.title = collection_config["License"][0]["Title"]
-                collection.links.append(link)
-            elif len(collection_config["License"]) > 1:
-                collection.license = "various"
-                for license_entry in collection_config["License"]:
-                    link = Link(
-                        rel="license",
-                        target=license_entry["Url"],
-                        media_type="text/html"
-                        if "Type" in license_entry
-                        else license_entry["Type"],
-                    )
-                    if "Title" in license_entry:
-                        link.title = license_entry["Title"]
-                    collection.links.append(link)
+                for license_entry in license_config
+            )
         else:
-            license_data = lookup.by_id(collection_config["License"])
+            license_data = _spdx_by_id(license_config)
             if license_data is not None:
-                collection.license = license_data.id
-                if license_data.sources:
+                license_id, license_sources = license_data
+                collection.license = license_id
+                if license_sources:
                     # add links to licenses
-                    for source in license_data.sources:
-                        collection.links.append(
-                            Link(
-                                rel="license",
-                                target=source,
-                                media_type="text/html",
-                            )
+                    collection.links.extend(
+                        Link(
+                            rel="license",
+                            target=source,
+                            media_type="text/html",
                         )
+                        for source in license_sources
+                    )
             else:
                 # fallback to proprietary
-                LOGGER.warn("License could not be parsed, falling back to proprietary")
+                LOGGER.warning("License could not be parsed, falling back to proprietary")
                 collection.license = "proprietary"
     else:
         pass
 
-    if "Provider" in collection_config:
+    if (providers := collection_config.get("Provider")) is not None:
         try:
             collection.providers = [
                 Provider(
                     # convert information to lower case
                     **{k.lower(): v for k, v in provider.items()}
                 )
-                for provider in collection_config["Provider"]
+                for provider in providers
             ]
         except Exception:
-            LOGGER.warn(f"Issue creating provider information for collection: {collection.id}")
-
-    if "Citation" in collection_config:
-        if "DOI" in collection_config["Citation"]:
-            collection.extra_fields["sci:doi"] = collection_config["Citation"]["DOI"]
-        if "Citation" in collection_config["Citation"]:
-            collection.extra_fields["sci:citation"] = collection_config["Citation"]["Citation"]
-        if "Publication" in collection_config["Citation"]:
-            collection.extra_fields["sci:publications"] = [
+            LOGGER.warning("Issue creating provider information", collection_id=collection.id)
+
+    if (citation := collection_config.get("Citation")) is not None:
+        if "DOI" in citation:
+            extra_fields["sci:doi"] = citation["DOI"]
+        if "Citation" in citation:
+            extra_fields["sci:citation"] = citation["Citation"]
+        if "Publication" in citation:
+            extra_fields["sci:publications"] = [
                 # convert keys to lower case
                 {k.lower(): v for k, v in publication.items()}
-                for publication in collection_config["Citation"]["Publication"]
+                for publication in citation["Publication"]
             ]
 
     if "Subtitle" in collection_config:
-        collection.extra_fields["subtitle"] = collection_config["Subtitle"]
-    if "Legend" in collection_config:
+        extra_fields["subtitle"] = collection_config["Subtitle"]
+    if (legend := collection_config.get("Legend")) is not None:
         collection.add_asset(
             "legend",
             Asset(
-                href=f'{catalog_config["assets_endpoint"]}/{collection_config["Legend"]}',
+                href=f"{assets_endpoint}/{legend}",
                 media_type="image/png",
                 roles=["metadata"],
             ),
         )
-    if "Story" in collection_config:
+    if (story := collection_config.get("Story")) is not None:
         collection.add_asset(
             "story",
             Asset(
-                href=f'{catalog_config["assets_endpoint"]}/{collection_config["Story"]}',
+                href=f"{assets_endpoint}/{story}",
                 media_type="text/markdown",
                 roles=["metadata"],
             ),
         )
-    if "Image" in collection_config:
+    if (image := collection_config.get("Image")) is not None:
+        thumbnail_href = f"{assets_endpoint}/{image}"
         collection.add_asset(
             "thumbnail",
             Asset(
-                href=f'{catalog_config["assets_endpoint"]}/{collection_config["Image"]}',
+                href=thumbnail_href,
                 media_type="image/png",
                 roles=["thumbnail"],
             ),
         )
         # Bubble up thumbnail to extra fields
-        collection.extra_fields["thumbnail"] = (
-            f'{catalog_config["assets_endpoint"]}/' f'{collection_config["Image"]}'
-        )
+        extra_fields["thumbnail"] = thumbnail_href
     # Add extra fields to collection if available
     add_extra_fields(collection, collection_config)
 
@@ -349,8 +600,12 @@ def add_collection_information(
 def add_process_info(collection: Collection, catalog_config: dict, collection_config: dict) -> None:
     if "Process" in collection_config:
         if "EndPoints" in collection_config["Process"]:
-            for endpoint in collection_config["Process"]["EndPoints"]:
-                collection.add_link(create_service_link(endpoint, catalog_config))
+            collection.add_links(
+                [
+                    create_service_link(endpoint, catalog_config)
+                    for endpoint in collection_config["Process"]["EndPoints"]
+                ]
+            )
         if "JsonForm" in collection_config["Process"]:
             collection.extra_fields["eodash:jsonform"] = get_full_url(
                 collection_config["Process"]["JsonForm"], catalog_config
@@ -375,11 +630,9 @@ def add_process_info(collection: Collection, catalog_config: dict, collection_co
                 collection.add_link(
                     Link(
                         rel="service",
-                        target="{}{}_{}{}".format(
-                            resource["EndPoint"],
-                            resource["Database"],
-                            resource["CollectionId"],
-                            query_string,
+                        target=(
+                            f'{resource["EndPoint"]}{resource["Database"]}_'
+                            f'{resource["CollectionId"]}{query_string}'
                         ),
                         media_type="application/json",
                         extra_fields={
@@ -395,100 +648,161 @@ def add_base_overlay_info(
 ) -> None:
     # add custom baselayers specially for this indicator
     if "BaseLayers" in collection_config:
-        for layer in collection_config["BaseLayers"]:
-            collection.add_link(create_web_map_link(layer, role="baselayer"))
+        collection.add_links(
+            [
+                create_web_map_link(layer, role="baselayer")
+                for layer in collection_config["BaseLayers"]
+            ]
+        )
     # alternatively use default base layers defined
     elif "default_base_layers" in catalog_config:
-        with open(f'{catalog_config["default_base_layers"]}.yaml') as f:
-            base_layers = yaml.load(f, Loader=SafeLoader)
-            for layer in base_layers:
-                collection.add_link(create_web_map_link(layer, role="baselayer"))
+        path = f'{catalog_config["default_base_layers"]}.yaml'
+        collection.add_links(_get_default_web_map_links(path, "baselayer"))
     # add custom overlays just for this indicator
     if "OverlayLayers" in collection_config:
-        for layer in collection_config["OverlayLayers"]:
-            collection.add_link(create_web_map_link(layer, role="overlay"))
+        collection.add_links(
+            [
+                create_web_map_link(layer, role="overlay")
+                for layer in collection_config["OverlayLayers"]
+            ]
+        )
     # check if default overlay layers defined
     elif "default_overlay_layers" in catalog_config:
-        with open("{}.yaml".format(catalog_config["default_overlay_layers"])) as f:
-            overlay_layers = yaml.load(f, Loader=SafeLoader)
-            for layer in overlay_layers:
-                collection.add_link(create_web_map_link(layer, role="overlay"))
+        path = f'{catalog_config["default_overlay_layers"]}.yaml'
+        collection.add_links(_get_default_web_map_links(path, "overlay"))
+
+
+# configuration keys directly taken over as extra fields
+_EXTRA_FIELD_MAP = {
+    "yAxis": "yAxis",
+    "Themes": "themes",
+    "Tags": "tags",
+    "Satellite": "satellite",
+    "Sensor": "sensor",
+    "Agency": "agency",
+    "EodashIdentifier": "subcode",
+    "CollectionGroup": "collection_group",
+    "MapProjection": "eodash:mapProjection",
+}
+# nested DataSource keys, Spaceborne entries overwrite top level Sensor and Satellite
+_DATA_SOURCE_FIELD_MAP = {
+    "InSitu": "insituSources",
+    "Other": "otherSources",
+}
+_SPACEBORNE_FIELD_MAP = {
+    "Sensor": "sensor",
+    "Satellite": "satellite",
+}
+# tells keys configured as null apart from missing ones
+_MISSING = object()
+
+# list valued fields repeated across many collections, their strings are interned
+_SHARED_LIST_FIELDS = frozenset(("themes", "tags", "satellite", "sensor", "agency"))
+
+
+def _get_extra_field_value(field_key: str, value):
+    if (
+        field_key in _SHARED_LIST_FIELDS
+        and isinstance(value, list)
+        and all(isinstance(v, str) for v in value)
+    ):
+        # a fresh list per collection, only the strings themselves are shared
+        return [sys.intern(v) for v in value]
+    return value
 
 
 def add_extra_fields(stac_object: Collection | Link, collection_config: dict) -> None:
-    if "yAxis" in collection_config:
-        stac_object.extra_fields["yAxis"] = collection_config["yAxis"]
-    if "Themes" in collection_config:
-        stac_object.extra_fields["themes"] = collection_config["Themes"]
+    # collect fields first and add them with a single update, keys configured as null are
+    # kept as null fields
+    fields: dict = {}
+    for config_key, field_key in _EXTRA_FIELD_MAP.items():
+        if (value := collection_config.get(config_key, _MISSING)) is not _MISSING:
+            fields[field_key] = _get_extra_field_value(field_key, value)
     if "Locations" in collection_config or "Subcollections" in collection_config:
-        stac_object.extra_fields["locations"] = True
-    if "Tags" in collection_config:
-        stac_object.extra_fields["tags"] = collection_config["Tags"]
-    if "Satellite" in collection_config:
-        stac_object.extra_fields["satellite"] = collection_config["Satellite"]
-    if "Sensor" in collection_config:
-        stac_object.extra_fields["sensor"] = collection_config["Sensor"]
-    if "Agency" in collection_config:
-        stac_object.extra_fields["agency"] = collection_config["Agency"]
-    if "EodashIdentifier" in collection_config:
-        stac_object.extra_fields["subcode"] = collection_config["EodashIdentifier"]
-    if "CollectionGroup" in collection_config:
-        stac_object.extra_fields["collection_group"] = collection_config["CollectionGroup"]
-    if "DataSource" in collection_config:
-        if "Spaceborne" in collection_config["DataSource"]:
-            if "Sensor" in collection_config["DataSource"]["Spaceborne"]:
-                stac_object.extra_fields["sensor"] = collection_config["DataSource"]["Spaceborne"][
-                    "Sensor"
-                ]
-            if "Satellite" in collection_config["DataSource"]["Spaceborne"]:
-                stac_object.extra_fields["satellite"] = collection_config["DataSource"][
-                    "Spaceborne"
-                ]["Satellite"]
-        if "InSitu" in collection_config["DataSource"]:
-            stac_object.extra_fields["insituSources"] = collection_config["DataSource"]["InSitu"]
-        if "Other" in collection_config["DataSource"]:
-            stac_object.extra_fields["otherSources"] = collection_config["DataSource"]["Other"]
-    if "MapProjection" in collection_config:
-        stac_object.extra_fields["eodash:mapProjection"] = collection_config["MapProjection"]
+        fields["locations"] = True
+    if data_source := collection_config.get("DataSource"):
+        spaceborne = data_source.get("Spaceborne") or {}
+        for config_key, field_key in _SPACEBORNE_FIELD_MAP.items():
+            if (value := spaceborne.get(config_key, _MISSING)) is not _MISSING:
+                fields[field_key] = _get_extra_field_value(field_key, value)
+        for config_key, field_key in _DATA_SOURCE_FIELD_MAP.items():
+            if (value := data_source.get(config_key, _MISSING)) is not _MISSING:
+                fields[field_key] = _get_extra_field_value(field_key, value)
+    stac_object.extra_fields.update(fields)
 
 
 def get_collection_datetimes_from_config(endpoint_config: dict) -> list[datetime]:
     times_datetimes: list[datetime] = []
     if endpoint_config:
         if endpoint_config.get("Times"):
-            times = list(endpoint_config.get("Times", []))
-            times_datetimes = sorted(
-                [parse_datestring_to_tz_aware_datetime(time) for time in times]
-            )
+            times_datetimes = list(_parse_sorted_times(tuple(endpoint_config["Times"])))
         elif endpoint_config.get("DateTimeInterval"):
-            start = endpoint_config["DateTimeInterval"].get("Start", "2020-09-01T00:00:00Z")
-            end = endpoint_config["DateTimeInterval"].get("End", "2020-10-01T00:00:00Z")
-            timedelta_config = endpoint_config["DateTimeInterval"].get("Timedelta", {"days": 1})
-            times_datetimes = generateDatetimesFromInterval(start, end, timedelta_config)
+            start, end, timedelta_config = _get_datetime_interval_config(endpoint_config)
+            if end == "today":
+                times_datetimes = generateDatetimesFromInterval(start, end, timedelta_config)
+            else:
+                times_datetimes = list(
+                    _generate_interval_datetimes(
+                        start, end, tuple(sorted(timedelta_config.items()))
+                    )
+                )
     return times_datetimes
 
 
+@lru_cache(maxsize=256)
+def _parse_sorted_times(times: tuple[str, ...]) -> tuple[datetime, ...]:
+    # endpoints of sibling collections often share the same list of times
+    return tuple(sorted(parse_datestring_to_tz_aware_datetime(time) for time in times))
+
+
+@lru_cache(maxsize=64)
+def _generate_interval_datetimes(
+    start: str, end: str, timedelta_items: tuple[tuple[str, float], ...]
+) -> tuple[datetime, ...]:
+    return tuple(generateDatetimesFromInterval(start, end, dict(timedelta_items)))
+
+
+def _get_datetime_interval_config(endpoint_config: dict) -> tuple[str, str, dict]:
+    interval_config = endpoint_config["DateTimeInterval"]
+    return (
+        interval_config.get("Start", "2020-09-01T00:00:00Z"),
+        interval_config.get("End", "2020-10-01T00:00:00Z"),
+        interval_config.get("Timedelta", {"days": 1}),
+    )
+
+
+def get_collection_datetime_bounds(endpoint_config: dict) -> list[datetime]:
+    if endpoint_config.get("Times"):
+        times_datetimes = _parse_sorted_times(tuple(endpoint_config["Times"]))
+        return [times_datetimes[0], times_datetimes[-1]]
+    elif endpoint_config.get("DateTimeInterval"):
+        # bounds are computed directly instead of generating every step of the interval
+        return getDatetimeBoundsFromInterval(*_get_datetime_interval_config(endpoint_config))
+    return []
+
+
 def add_projection_info(
     endpoint_config: dict, stac_object: Item | Asset | Collection | Link
 ) -> None:
+    _add_projection_fields(endpoint_config, stac_object.extra_fields)
+
+
+def _add_projection_fields(endpoint_config: dict, extra_fields: dict) -> None:
     if proj := endpoint_config.get("DataProjection"):
         if isinstance(proj, str):
-            if proj.lower().startswith("epsg"):
-                # consider input such as "EPSG:4326"
-                proj = proj.lower().split("EPSG:")[1]
-            # consider a number only
-            proj = int(proj)
+            # consider input such as "EPSG:4326" or a number only
+            proj = int(proj.lower().removeprefix("epsg").removeprefix(":"))
         if isinstance(proj, int):
-            # only set if not existing on source stac_object
-            if not stac_object.extra_fields.get("proj:epsg"):
+            # only set if not existing on source extra fields
+            if not extra_fields.get("proj:epsg"):
                 # handling EPSG code for "proj:epsg"
-                stac_object.extra_fields["proj:epsg"] = proj
+                extra_fields["proj:epsg"] = proj
         elif isinstance(proj, dict):
             # custom handling due to incompatibility of proj4js supported syntax (WKT1)
             # and STAC supported syntax (projjson or WKT2)
             # so we are taking over the DataProjection as is and deal with it in the eodash client
             # in a non-standard compliant way
             # https://github.com/proj4js/proj4js/issues/400
-            stac_object.extra_fields["eodash:proj4_def"] = proj
+            extra_fields["eodash:proj4_def"] = proj
         else:
             raise Exception(f"Incorrect type of proj definition {proj}")
@@ -1,14 +1,64 @@
+import hashlib
 import os
 import re
+import shutil
+import time
+import uuid
 from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-import requests
 from pystac import (
     Item,
 )
 
+from eodash_catalog.stac_handling import get_session
 from eodash_catalog.utils import format_datetime_to_isostring_zulu, generate_veda_cog_link
 
+# connect and read timeout in seconds for thumbnail requests
+THUMBNAIL_TIMEOUT = (3, 30)
+# seconds after which a cached thumbnail is downloaded again
+THUMBNAIL_CACHE_TTL = 7 * 24 * 60 * 60
+# tile placeholders of the VEDA tiles url
+TILE_PLACEHOLDER_REGEX = re.compile(r"\{[zxy]\}")
+
+
+def _get_thumbnail_cache_path(url: str) -> str | None:
+    # thumbnails share the optional on-disk cache directory with markdown descriptions,
+    # keyed on the url with sorted query parameters so equivalent requests hit the same file
+    if cache_dir := os.getenv("EODASH_HTTP_CACHE"):
+        parsed = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+        canonical_url = urlunsplit(parsed._replace(query=query))
+        key = hashlib.blake2b(canonical_url.encode(), digest_size=16).hexdigest()
+        return os.path.join(cache_dir, "thumbnails", f"{key}.png")
+    return None
+
+
+def _is_thumbnail_cached(cache_path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(cache_path) < THUMBNAIL_CACHE_TTL
+    except OSError:
+        return False
+
+
+def _download_thumbnail(url: str, image_path: str) -> bool:
+    # reuse pooled connections of the shared session and stream the image to a temporary
+    # file, only a complete image is moved into place
+    tmp_path = f"{image_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with get_session().get(url, timeout=THUMBNAIL_TIMEOUT, stream=True) as response:
+            if not response.ok:
+                return False
+            response.raw.decode_content = True
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(response.raw, f)
+        os.replace(tmp_path, image_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
 
 def fetch_and_save_thumbnail(collection_config: dict, url: str) -> None:
     collection_path = "../thumbnails/{}_{}/".format(
@@ -17,9 +67,15 @@ def fetch_and_save_thumbnail(collection_config: dict, url: str) -> None:
     Path(collection_path).mkdir(parents=True, exist_ok=True)
     image_path = f"{collection_path}/thumbnail.png"
     if not os.path.exists(image_path):
-        dd = requests.get(url).content
-        with open(image_path, "wb") as f:
-            f.write(dd)
+        cache_path = _get_thumbnail_cache_path(url)
+        if cache_path and _is_thumbnail_cached(cache_path):
+            shutil.copyfile(cache_path, image_path)
+        elif _download_thumbnail(url, image_path) and cache_path:
+            # write to a temporary file first so concurrent builds never read a partial image
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(image_path, tmp_path)
+            os.replace(tmp_path, cache_path)
 
 
 def generate_thumbnail(
@@ -57,5 +113,5 @@ def generate_thumbnail(
     elif endpoint_config["Name"] == "VEDA":
         target_url = generate_veda_cog_link(endpoint_config, file_url)
         # set to get 0/0/0 tile
-        url = re.sub(r"\{.\}", "0", target_url)
+        url = TILE_PLACEHOLDER_REGEX.sub("0", target_url)
         fetch_and_save_thumbnail(collection_config, url)
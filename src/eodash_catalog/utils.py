@@ -1,14 +1,16 @@
 import os
 import re
-import threading
 import time
 import uuid
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from functools import reduce, wraps
+from functools import lru_cache, wraps
+from itertools import islice
 from typing import Any
+from urllib.parse import quote
 
 from dateutil import parser
 from owslib.wcs import WebCoverageService
@@ -21,6 +23,12 @@ from structlog import get_logger
 
 from eodash_catalog.duration import Duration
 
+try:
+    # libyaml based loader is considerably faster if available
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader  # type: ignore # noqa: F401
+
 ISO8601_PERIOD_REGEX = re.compile(
     r"^(?P<sign>[+-])?"
     r"P(?!\b)"
@@ -33,13 +41,25 @@ ISO8601_PERIOD_REGEX = re.compile(
     r"(?P<seconds>[0-9]+([,.][0-9]+)?S)?)?$"
 )
 # regular expression to parse ISO duartion strings.
+ENV_VARIABLE_REGEX = re.compile(r"\{(\w+)\}")
+# placeholders in curly brackets replaced by environment variables
 
 LOGGER = get_logger(__name__)
+# marks an exhausted iterator, as None may be a regular element
+_SENTINEL = object()
+CHILD_OR_ITEM_RELS = frozenset((RelType.CHILD, RelType.ITEM))
+# pending capabilities requests started by prefetch_capabilities
+# pending capabilities requests of one catalog build, keyed by url, version, service type
+# and layer filter
+CapabilitiesFutures = dict[tuple[str, str, str, str | None], Future[Any]]
 
 
 def create_geojson_point(lon: int | float, lat: int | float) -> dict[str, Any]:
-    point = {"type": "Point", "coordinates": [lon, lat]}
-    return {"type": "Feature", "geometry": point, "properties": {}}
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": {},
+    }
 
 
 def create_geojson_from_bbox(bbox: list[float | int]) -> dict:
@@ -57,15 +77,75 @@ def create_geojson_from_bbox(bbox: list[float | int]) -> dict:
     return feature_collection
 
 
+def get_capabilities_service(capabilities_url: str, version: str, service_type: str) -> Any:
+    if service_type == "WCS":
+        return WebCoverageService(capabilities_url, version)
+    if service_type == "WMTS":
+        return WebMapTileService(capabilities_url)
+    return WebMapService(capabilities_url, version=version)
+
+
+def _load_capabilities_service(
+    capabilities_url: str, version: str, service_type: str, layer: str | None = None
+) -> Any:
+    if layer is not None:
+        return get_layer_capabilities_service(capabilities_url, layer, version, service_type)
+    return get_capabilities_service(capabilities_url, version, service_type)
+
+
+def prefetch_capabilities(
+    capabilities_requests: Iterable[tuple[str, str, str, str | None]],
+    futures: CapabilitiesFutures,
+    workers: int = 8,
+) -> None:
+    # start requesting capabilities in the background, the extent retrieval picks up the
+    # results so collections can already be processed while requests are in flight
+    executor = ThreadPoolExecutor(max_workers=workers)
+    for request in set(capabilities_requests):
+        if request not in futures:
+            futures[request] = executor.submit(_load_capabilities_service, *request)
+    executor.shutdown(wait=False)
+
+
+def load_capabilities_service(
+    capabilities_url: str,
+    version: str,
+    service_type: str,
+    layer: str | None = None,
+    futures: CapabilitiesFutures | None = None,
+) -> Any:
+    # capabilities documents can be large and are shared by all layers of an endpoint, so
+    # they are only requested and parsed once per catalog build and kept in its futures
+    request = (capabilities_url, version, service_type, layer)
+    if futures is None:
+        return _load_capabilities_service(*request)
+    if future := futures.get(request):
+        try:
+            return future.result()
+        except Exception as e:
+            LOGGER.warning(
+                "Capabilities could not be prefetched", url=capabilities_url, error=str(e)
+            )
+    service = _load_capabilities_service(*request)
+    future = futures[request] = Future()
+    future.set_result(service)
+    return service
+
+
 def retrieveExtentFromWCS(
     capabilities_url: str,
     coverage: str,
     version: str = "2.0.1",
+    capabilities_futures: CapabilitiesFutures | None = None,
 ) -> tuple[list[float], list[datetime]]:
     times = []
+    coverage_info = None
     try:
-        service = WebCoverageService(capabilities_url, version)
-        if coverage in list(service.contents):
+        service = load_capabilities_service(
+            capabilities_url, version, "WCS", futures=capabilities_futures
+        )
+        if coverage in service.contents:
+            coverage_info = service[coverage]
             description = service.getDescribeCoverage(coverage)
             area_val = description.findall(".//{http://www.rasdaman.org}areasOfValidity")
             if len(area_val) == 1:
@@ -73,21 +153,21 @@ def retrieveExtentFromWCS(
                 if len(areas) > 1:
                     times = [t.get("start") for t in areas]
             # get unique times
-            times = reduce(lambda re, x: [*re, x] if x not in re else re, times, [])
+            times = list(dict.fromkeys(times))
     except Exception as e:
-        LOGGER.warn("Issue extracting information from service capabilities")
+        LOGGER.warning("Issue extracting information from service capabilities")
         template = "An exception of type {0} occurred. Arguments:\n{1!r}"
         message = template.format(type(e).__name__, e.args)
-        LOGGER.warn(message)
+        LOGGER.warning(message)
 
     bbox = [-180.0, -90.0, 180.0, 90.0]
     owsnmspc = "{http://www.opengis.net/ows/2.0}"
     # somehow this is not parsed from the rasdaman endpoint
-    if service and service[coverage].boundingBoxWGS84:
-        bbox = [float(x) for x in service[coverage].boundingBoxWGS84]
-    elif service:
+    if coverage_info is not None and coverage_info.boundingBoxWGS84:
+        bbox = [float(x) for x in coverage_info.boundingBoxWGS84]
+    elif coverage_info is not None:
         # we try to get it ourselves
-        wgs84bbox = service.contents[coverage]._elem.findall(".//" + owsnmspc + "WGS84BoundingBox")
+        wgs84bbox = coverage_info._elem.findall(".//" + owsnmspc + "WGS84BoundingBox")
         if len(wgs84bbox) == 1:
             lc = wgs84bbox[0].find(".//" + owsnmspc + "LowerCorner").text
             uc = wgs84bbox[0].find(".//" + owsnmspc + "UpperCorner").text
@@ -97,69 +177,111 @@ def retrieveExtentFromWCS(
                 float(uc.split()[0]),
                 float(uc.split()[1]),
             ]
-        description.findall(".//{http://www.rasdaman.org}areasOfValidity")
 
     datetimes = [parse_datestring_to_tz_aware_datetime(time_str) for time_str in times]
     return bbox, datetimes
 
 
+def get_layer_capabilities_service(
+    capabilities_url: str, layer: str, version: str, service_type: str
+) -> Any:
+    # servers such as GeoWebCache accept a LAYERS parameter on GetCapabilities and only
+    # describe that layer, which avoids downloading the capabilities of the whole service
+    separator = "&" if "?" in capabilities_url else "?"
+    layer_url = f"{capabilities_url}{separator}LAYERS={quote(layer)}"
+    try:
+        service = get_capabilities_service(layer_url, version, service_type)
+        if layer in service.contents:
+            return service
+    except Exception as e:
+        LOGGER.warning(
+            "Could not request layer capabilities", url=layer_url, error=type(e).__name__
+        )
+    # fall back to the full capabilities if the parameter is not supported
+    return get_capabilities_service(capabilities_url, version, service_type)
+
+
 def retrieveExtentFromWMSWMTS(
-    capabilities_url: str, layer: str, version: str = "1.1.1", wmts: bool = False
+    capabilities_url: str,
+    layer: str,
+    version: str = "1.1.1",
+    wmts: bool = False,
+    filter_layer: bool = False,
+    capabilities_futures: CapabilitiesFutures | None = None,
 ) -> tuple[list[float], list[datetime]]:
     times = []
+    layer_info = None
     try:
-        if not wmts:
-            service = WebMapService(capabilities_url, version=version)
-        else:
-            service = WebMapTileService(capabilities_url)
-        if layer in list(service.contents):
+        service = load_capabilities_service(
+            capabilities_url,
+            version,
+            "WMTS" if wmts else "WMS",
+            layer if filter_layer else None,
+            capabilities_futures,
+        )
+        if layer in service.contents:
+            layer_info = service[layer]
             tps = []
-            if not wmts and service[layer].timepositions is not None:
-                tps = service[layer].timepositions
+            if not wmts and layer_info.timepositions is not None:
+                tps = layer_info.timepositions
             elif wmts:
-                time_dimension = service[layer].dimensions.get("time")
+                time_dimension = layer_info.dimensions.get("time")
                 # specifically taking 'time' dimension
                 if time_dimension:
                     tps = time_dimension["values"]
             for tp in tps:
-                tp_def = tp.split("/")
+                tp_def = [part.strip() for part in tp.replace("\n", "").split("/")]
                 if len(tp_def) > 1:
+                    # time positions are ISO 8601, which the cached parser handles without
+                    # going through the general dateutil parser
                     dates = interval(
-                        parser.parse(tp_def[0]),
-                        parser.parse(tp_def[1]),
+                        parse_datestring_to_tz_aware_datetime(tp_def[0]),
+                        parse_datestring_to_tz_aware_datetime(tp_def[1]),
                         parse_duration(tp_def[2]),
                     )
-                    times += [x.strftime("%Y-%m-%dT%H:%M:%SZ") for x in dates]
+                    # same output as strftime("%Y-%m-%dT%H:%M:%SZ") without parsing a format
+                    times.extend(
+                        x.replace(microsecond=0, tzinfo=None).isoformat() + "Z" for x in dates
+                    )
                 else:
-                    times.append(tp)
-            times = [time.replace("\n", "").strip() for time in times]
+                    times.append(tp_def[0])
             # get unique times
-            times = reduce(lambda re, x: [*re, x] if x not in re else re, times, [])
+            times = list(dict.fromkeys(times))
     except Exception as e:
-        LOGGER.warn("Issue extracting information from service capabilities")
+        LOGGER.warning("Issue extracting information from service capabilities")
         template = "An exception of type {0} occurred. Arguments:\n{1!r}"
         message = template.format(type(e).__name__, e.args)
-        LOGGER.warn(message)
+        LOGGER.warning(message)
 
     bbox = [-180.0, -90.0, 180.0, 90.0]
-    if service and service[layer].boundingBoxWGS84:
-        bbox = [float(x) for x in service[layer].boundingBoxWGS84]
+    if layer_info is not None and layer_info.boundingBoxWGS84:
+        bbox = [float(x) for x in layer_info.boundingBoxWGS84]
 
     datetimes = [parse_datestring_to_tz_aware_datetime(time_str) for time_str in times]
     return bbox, datetimes
 
 
 def interval(start: datetime, stop: datetime, delta: timedelta) -> Iterator[datetime]:
-    while start <= stop:
-        yield start
-        start += delta
+    if isinstance(delta, timedelta) and delta > timedelta(0):
+        # fixed length steps, compute each datetime from the start instead of accumulating
+        yield from (start + step * delta for step in range((stop - start) // delta + 1))
+    else:
+        # calendar based durations (months, years) have to be added step by step
+        while start <= stop:
+            yield start
+            start += delta
     yield stop
 
 
+@lru_cache(maxsize=1024)
 def parse_duration(datestring):
     """
     Parses an ISO 8601 durations into datetime.timedelta
+
+    Results are cached and shared between callers, they must not be modified.
     """
+    # capabilities repeat the same few periods for every time position. timedelta objects
+    # are immutable, Duration objects are not, callers only add them to datetimes.
     if not isinstance(datestring, string_types):
         raise TypeError(f"Expecting a string {datestring}")
     match = ISO8601_PERIOD_REGEX.match(datestring)
@@ -169,13 +291,15 @@ def parse_duration(datestring):
     for key, val in groups.items():
         if key not in ("separator", "sign"):
             if val is None:
-                groups[key] = "0n"
-            if key in ("years", "months"):
-                groups[key] = Decimal(groups[key][:-1].replace(",", "."))
+                # absent fields need no Decimal or float parsing
+                groups[key] = 0
+            elif key in ("years", "months"):
+                # Duration keeps years and months as Decimal
+                groups[key] = Decimal(val[:-1].replace(",", "."))
             else:
                 # these values are passed into a timedelta object,
                 # which works with floats.
-                groups[key] = float(groups[key][:-1].replace(",", "."))
+                groups[key] = float(val[:-1].replace(",", "."))
     if groups["years"] == 0 and groups["months"] == 0:
         ret = timedelta(
             days=groups["days"],
@@ -201,9 +325,9 @@ def parse_duration(datestring):
     return ret
 
 
-def generateDatetimesFromInterval(
-    start: str, end: str, timedelta_config: dict | None = None
-) -> list[datetime]:
+def _parse_interval(
+    start: str, end: str, timedelta_config: dict | None
+) -> tuple[datetime, datetime, timedelta]:
     if timedelta_config is None:
         timedelta_config = {}
     start_dt = parse_datestring_to_tz_aware_datetime(start)
@@ -212,71 +336,124 @@ def generateDatetimesFromInterval(
     else:
         end_dt = parse_datestring_to_tz_aware_datetime(end)
     delta = timedelta(**timedelta_config)
-    dates = []
-    while start_dt <= end_dt:
-        dates.append(start_dt)
-        start_dt += delta
-    return dates
+    if delta <= timedelta(0):
+        raise ValueError(
+            f"Timedelta {timedelta_config} of interval {start} - {end} must be positive"
+        )
+    return start_dt, end_dt, delta
 
 
-class RaisingThread(threading.Thread):
-    def run(self):
-        self._exc = None
-        try:
-            super().run()
-        except Exception as e:
-            self._exc = e
-
-    def join(self, timeout=None):
-        super().join(timeout=timeout)
-        if self._exc:
-            raise self._exc
+def getDatetimeBoundsFromInterval(
+    start: str, end: str, timedelta_config: dict | None = None
+) -> list[datetime]:
+    # first and last datetime generateDatetimesFromInterval would return, without the steps between
+    start_dt, end_dt, delta = _parse_interval(start, end, timedelta_config)
+    if start_dt > end_dt:
+        return []
+    return [start_dt, start_dt + ((end_dt - start_dt) // delta) * delta]
 
 
-def recursive_save(stac_object: Catalog, no_items: bool = False) -> None:
-    stac_object.save_object()
+def generateDatetimesFromInterval(
+    start: str, end: str, timedelta_config: dict | None = None
+) -> list[datetime]:
+    start_dt, end_dt, delta = _parse_interval(start, end, timedelta_config)
+    if start_dt > end_dt:
+        return []
+    # the number of steps is known upfront, each datetime is computed from the start directly
+    steps = (end_dt - start_dt) // delta
+    return [start_dt + step * delta for step in range(steps + 1)]
+
+
+def collect_stac_objects(
+    stac_object: Catalog, no_items: bool = False
+) -> Iterator[Catalog | Collection | Item]:
+    yield stac_object
     for child in stac_object.get_children():
-        recursive_save(child, no_items)
+        yield from collect_stac_objects(child, no_items)
     if not no_items:
         # try to save items if available
-        for item in stac_object.get_items():
-            item.save_object()
+        yield from stac_object.get_items()
 
 
-def iter_len_at_least(i, n: int) -> int:
-    return sum(1 for _ in zip(range(n), i, strict=False)) == n
+def recursive_save(stac_object: Catalog, no_items: bool = False, max_workers: int = 8) -> None:
+    # hrefs are normalized beforehand, so every object is written to its own file
+    # independently and the blocking writes can overlap in a thread pool
+    pending: set[Future[None]] = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for obj in collect_stac_objects(stac_object, no_items):
+            if len(pending) >= 4 * max_workers:
+                # only keep a few writes queued while walking the tree, stop at the first error
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(obj.save_object))
+        for future in pending:
+            future.result()
 
 
-def generate_veda_cog_link(endpoint_config: dict, file_url: str | None) -> str:
+def add_children_bboxes(collection: Collection) -> None:
+    # Add bbox extents from children
+    collection.extent.spatial.bboxes.extend(
+        child.extent.spatial.bboxes[0]
+        for child in collection.get_children()
+        if isinstance(child, Collection)
+    )
+
+
+def iter_len_at_least(i, n: int) -> bool:
+    # only advance the iterator to its n-th element instead of counting every step
+    return n <= 0 or next(islice(i, n - 1, n), _SENTINEL) is not _SENTINEL
+
+
+def _freeze_config_value(value: Any) -> Any:
+    # lists from the yaml configuration are not hashable
+    return tuple(value) if isinstance(value, list) else value
+
+
+@lru_cache(maxsize=256)
+def _get_veda_query_params(
+    bidx_config: Any, colormap_config: Any, colormap_name_config: Any, rescale_config: Any
+) -> str:
     bidx = ""
-    if "Bidx" in endpoint_config:
+    if bidx_config is not None:
         # Check if an array was provided
-        if hasattr(endpoint_config["Bidx"], "__len__"):
-            for band in endpoint_config["Bidx"]:
+        if isinstance(bidx_config, tuple):
+            for band in bidx_config:
                 bidx = bidx + f"&bidx={band}"
         else:
-            bidx = "&bidx={}".format(endpoint_config["Bidx"])
+            bidx = f"&bidx={bidx_config}"
 
     colormap = ""
-    if "Colormap" in endpoint_config:
-        colormap = "&colormap={}".format(endpoint_config["Colormap"])
+    if colormap_config is not None:
+        colormap = f"&colormap={colormap_config}"
         # TODO: For now we assume a already urlparsed colormap definition
         # it could be nice to allow a json and better convert it on the fly
         # colormap = "&colormap=%s"%(urllib.parse.quote(str(endpoint_config["Colormap"])))
 
     colormap_name = ""
-    if "ColormapName" in endpoint_config:
-        colormap_name = "&colormap_name={}".format(endpoint_config["ColormapName"])
+    if colormap_name_config is not None:
+        colormap_name = f"&colormap_name={colormap_name_config}"
 
     rescale = ""
-    if "Rescale" in endpoint_config:
-        rescale = "&rescale={},{}".format(
-            endpoint_config["Rescale"][0], endpoint_config["Rescale"][1]
-        )
+    if rescale_config is not None:
+        rescale = f"&rescale={rescale_config[0]},{rescale_config[1]}"
+
+    return f"{bidx}{colormap}{colormap_name}{rescale}"
+
+
+def generate_veda_cog_link(endpoint_config: dict, file_url: str | None) -> str:
+    # the query parameters only depend on the endpoint configuration, which is the same
+    # for every item of a collection
+    query_params = _get_veda_query_params(
+        _freeze_config_value(endpoint_config.get("Bidx")),
+        endpoint_config.get("Colormap"),
+        endpoint_config.get("ColormapName"),
+        _freeze_config_value(endpoint_config.get("Rescale")),
+    )
 
     file_url = f"url={file_url}&" if file_url else ""
 
-    target_url = f"https://openveda.cloud/api/raster/cog/tiles/WebMercatorQuad/{{z}}/{{x}}/{{y}}?{file_url}resampling_method=nearest{bidx}{colormap}{colormap_name}{rescale}"
+    target_url = f"https://openveda.cloud/api/raster/cog/tiles/WebMercatorQuad/{{z}}/{{x}}/{{y}}?{file_url}resampling_method=nearest{query_params}"
     return target_url
 
 
@@ -293,10 +470,7 @@ class Options:
 
 
 def add_single_item_if_collection_empty(collection: Collection) -> None:
-    for link in collection.links:
-        if link.rel in [RelType.CHILD, RelType.ITEM]:
-            break
-    else:
+    if not any(link.rel in CHILD_OR_ITEM_RELS for link in collection.links):
         item = Item(
             id=str(uuid.uuid4()),
             bbox=[-180, -85, 180, 85],
@@ -309,19 +483,14 @@ def add_single_item_if_collection_empty(collection: Collection) -> None:
         collection.add_item(item)
 
 
-def replace_with_env_variables(s: str) -> str:
-    # Define the regex pattern to find text within curly brackets
-    pattern = r"\{(\w+)\}"
+def _replace_env_variable(match: re.Match) -> str:
+    # Get the environment variable value, if it doesn't exist, keep the original placeholder
+    return os.environ.get(match.group(1), match.group(0))
 
-    # Define the replacement function
-    def replacer(match):
-        # Extract the variable name from the match
-        var_name = match.group(1)
-        # Get the environment variable value, if it doesn't exist, keep the original placeholder
-        return os.getenv(var_name, match.group(0))
 
-    # Use re.sub with the replacement function
-    return re.sub(pattern, replacer, s)
+def replace_with_env_variables(s: str) -> str:
+    # Replace text within curly brackets with the environment variable of that name
+    return ENV_VARIABLE_REGEX.sub(_replace_env_variable, s)
 
 
 def retry(exceptions, tries=3, delay=2, backoff=1, logger=None):
@@ -374,8 +543,16 @@ def filter_time_entries(time_entries: list[datetime], query: dict[str, str]) ->
     return time_entries
 
 
+@lru_cache(maxsize=4096)
 def parse_datestring_to_tz_aware_datetime(datestring: str) -> datetime:
-    dt = parser.isoparse(datestring)
+    # the same time entries are configured for many collections and layers of a service often
+    # share a time dimension, datetimes are immutable so they can be shared. The cache has to
+    # hold a whole time dimension, as scanning more entries than fit always misses
+    try:
+        # the standard library parser is considerably faster for the common formats
+        dt = datetime.fromisoformat(datestring)
+    except ValueError:
+        dt = parser.isoparse(datestring)
     dt = pytztimezone("UTC").localize(dt) if dt.tzinfo is None else dt
     return dt
 
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+from eodash_catalog import stac_handling
+
+
+class FakeRaw:
+    def __init__(self, content):
+        self.stream = io.BytesIO(content)
+
+    def read(self, amt=None, decode_content=False):
+        return self.stream.read(amt)
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.raw = FakeRaw(content)
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def fake_session():
+    # replaces the shared HTTP session, responses are returned in the given order
+    original_session = stac_handling.get_session()
+
+    def use(*responses):
+        session = FakeSession(*responses)
+        stac_handling.set_session(session)
+        return session
+
+    yield use
+    stac_handling.set_session(original_session)
@@ -1,11 +1,14 @@
 import json
 import os
+import re
 import shutil
 from datetime import datetime
 
 import pytest
+import yaml
 from dateutil import parser
-from eodash_catalog.generate_indicators import process_catalog_file
+from eodash_catalog.endpoints import get_capabilities_request
+from eodash_catalog.generate_indicators import collect_prefetch_targets, process_catalog_file
 from eodash_catalog.utils import (
     Options,
 )
@@ -187,3 +190,88 @@ def test_baselayer_with_custom_projection_added(catalog_output_folder):
         assert len(baselayer_links) == 1
         # test that custom proj4 definition is added to link
         assert baselayer_links[0]["eodash:proj4_def"]["name"] == "ORTHO:680500"
+
+
+def test_prefetch_targets_skip_resources_without_endpoint(tmp_path):
+    (tmp_path / "indicator.yaml").write_text(
+        "Name: indicator\nDescription: https://assets.example/indicator.md\n"
+        "Collections: [collection]\n"
+    )
+    (tmp_path / "collection.yaml").write_text(
+        "Name: collection\n"
+        "Description: inline description\n"
+        "Resources:\n"
+        "  - Name: WMS\n"
+        "    LayerId: missing_endpoint\n"
+        "  - Name: marinedatastore\n"
+        "    EndPoint: https://wmts.example\n"
+        "    LayerId: layer\n"
+        "    FilterCapabilitiesByLayer: true\n"
+    )
+    options = Options(
+        catalogspath="",
+        collectionspath=str(tmp_path),
+        indicatorspath=str(tmp_path),
+        outputpath="",
+        vd=None,
+        ni=None,
+        tn=None,
+        collections=[],
+    )
+    urls: set[str] = set()
+    capabilities_requests: set = set()
+    configs: dict = {}
+    collect_prefetch_targets(
+        {}, f"{tmp_path}/indicator.yaml", options, urls, capabilities_requests, configs
+    )
+    assert urls == {"https://assets.example/indicator.md"}
+    assert capabilities_requests == {("https://wmts.example", "1.1.1", "WMTS", "layer")}
+    assert set(configs) == {f"{tmp_path}/indicator.yaml", f"{tmp_path}/collection.yaml"}
+    # the resource without EndPoint fails when the collection is processed
+    with pytest.raises(ValueError, match="No EndPoint"):
+        get_capabilities_request(configs[f"{tmp_path}/collection.yaml"]["Resources"][0])
+
+
+def read_normalized_output(output_folder):
+    # uuid item ids and timestamps of the build time differ between builds
+    variable = re.compile(
+        r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+        r"|\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z"
+    )
+    output = {}
+    for root, _, files in os.walk(output_folder):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            with open(path) as fp:
+                text = fp.read().replace(str(output_folder), "")
+            output[os.path.relpath(path, output_folder)] = variable.sub("", text)
+    return output
+
+
+def test_concurrent_collections_match_sequential_build(tmp_path):
+    with open(os.path.join("testing-catalogs", "testing.yaml")) as fp:
+        catalog_config = yaml.safe_load(fp)
+    outputs = []
+    for collection_workers in (1, 4):
+        catalog_path = tmp_path / f"testing_{collection_workers}.yaml"
+        with open(catalog_path, "w") as fp:
+            yaml.safe_dump({**catalog_config, "collection_workers": collection_workers}, fp)
+        output_folder = tmp_path / f"build_{collection_workers}"
+        options = Options(
+            catalogspath="testing-catalogs",
+            collectionspath="testing-collections",
+            indicatorspath="testing-indicators",
+            outputpath=str(output_folder),
+            vd=None,
+            ni=True,
+            tn=None,
+            collections=[],
+        )
+        process_catalog_file(str(catalog_path), options)
+        outputs.append(read_normalized_output(output_folder))
+    sequential, concurrent = outputs
+    with open(tmp_path / "build_1" / "testing-catalog-id" / "catalog.json") as fp:
+        child_links = [link for link in json.load(fp)["links"] if link["rel"] == "child"]
+    assert len(child_links) == len(catalog_config["collections"])
+    # same files with the same content, including the order of child links
+    assert concurrent == sequential
@@ -0,0 +1,179 @@
+import json
+from concurrent.futures import Future
+from datetime import datetime
+
+from eodash_catalog import stac_handling
+from eodash_catalog.stac_handling import (
+    _get_default_web_map_links,
+    add_collection_information,
+    add_extra_fields,
+    add_projection_info,
+    get_child_collection,
+    get_collection_datetime_bounds,
+)
+from eodash_catalog.utils import generateDatetimesFromInterval
+from pystac import Catalog, Collection, Extent, SpatialExtent, TemporalExtent
+from structlog.testing import capture_logs
+
+from .conftest import FakeResponse
+
+
+def create_collection():
+    return Collection(
+        id="test_collection",
+        description="test",
+        extent=Extent(
+            SpatialExtent([[-180, -90, 180, 90]]), TemporalExtent([[datetime.now(), None]])
+        ),
+    )
+
+
+def test_multiple_licenses_added_as_links():
+    collection = create_collection()
+    collection_config = {
+        "License": [
+            {"Url": "https://license-1.example", "Title": "License 1"},
+            {"Url": "https://license-2.example", "Type": "text/plain"},
+        ]
+    }
+    add_collection_information({}, collection, collection_config)
+    assert collection.license == "various"
+    license_links = [link for link in collection.links if link.rel == "license"]
+    assert len(license_links) == 2
+    # media type defaults to text/html if not configured
+    assert license_links[0].media_type == "text/html"
+    assert license_links[0].title == "License 1"
+    assert license_links[1].media_type == "text/plain"
+
+
+def test_datetime_interval_bounds_match_generated_datetimes():
+    interval = {
+        "Start": "2020-01-01T00:00:00Z",
+        "End": "2021-03-07T05:00:00Z",
+        "Timedelta": {"hours": 7, "minutes": 13},
+    }
+    datetimes = generateDatetimesFromInterval(
+        interval["Start"], interval["End"], interval["Timedelta"]
+    )
+    bounds = get_collection_datetime_bounds({"DateTimeInterval": interval})
+    assert bounds == [datetimes[0], datetimes[-1]]
+
+
+def test_projection_info_parses_epsg_strings():
+    for data_projection in (3035, "3035", "EPSG:3035", "epsg:3035"):
+        collection = create_collection()
+        add_projection_info({"DataProjection": data_projection}, collection)
+        assert collection.extra_fields["proj:epsg"] == 3035
+
+
+def test_extra_field_lists_are_not_shared():
+    first, second = create_collection(), create_collection()
+    add_extra_fields(first, {"Themes": ["air", "water"], "Tags": [{"name": "x"}, "y"]})
+    add_extra_fields(second, {"Themes": ["air", "water"]})
+    assert first.extra_fields["themes"] == ["air", "water"]
+    assert first.extra_fields["tags"] == [{"name": "x"}, "y"]
+    first.extra_fields["themes"].append("land")
+    assert second.extra_fields["themes"] == ["air", "water"]
+
+
+def test_child_collection_lookup_follows_link_changes():
+    catalog = Catalog(id="catalog", description="test")
+    first = create_collection()
+    first.id = "first"
+    catalog.add_child(first)
+    assert get_child_collection(catalog, "first") is first
+    # remove one child and add another, the number of links stays the same
+    catalog.remove_child("first")
+    second = create_collection()
+    second.id = "second"
+    catalog.add_child(second)
+    assert get_child_collection(catalog, "first") is None
+    assert get_child_collection(catalog, "second") is second
+    catalog.links = [link for link in catalog.links if link.rel != "child"]
+    assert get_child_collection(catalog, "second") is None
+
+
+def test_default_web_map_links_do_not_share_nested_fields(tmp_path):
+    layers_path = tmp_path / "baselayers.yaml"
+    layers_path.write_text(
+        "- id: layer\n"
+        "  name: Layer\n"
+        "  protocol: WMS\n"
+        "  url: https://wms.example\n"
+        "  layers: layer\n"
+        "  dimensions:\n"
+        "    time: '2020'\n"
+    )
+    first = _get_default_web_map_links(str(layers_path), "baselayer")[0]
+    first.extra_fields["wms:dimensions"]["time"] = "2021"
+    first.extra_fields["roles"].append("visible")
+    second = _get_default_web_map_links(str(layers_path), "baselayer")[0]
+    assert second.extra_fields["wms:dimensions"] == {"time": "2020"}
+    assert second.extra_fields["roles"] == ["baselayer"]
+
+
+def test_markdown_exceeding_size_limit_is_reported(fake_session, monkeypatch):
+    monkeypatch.setattr(stac_handling, "_MARKDOWN_MAX_BYTES", 5)
+    fake_session(FakeResponse(200, "abcdä".encode()))
+    with capture_logs() as logs:
+        text = stac_handling._fetch_markdown("https://assets.example/a.md")
+    # the two byte character is split by the limit
+    assert text == "abcd�"
+    assert any("truncated" in log["event"] for log in logs)
+
+
+def test_failed_markdown_requests_are_not_cached(fake_session):
+    session = fake_session(FakeResponse(503), FakeResponse(200, b"# Title"))
+    url = "https://assets.example/b.md"
+    assert stac_handling._get_markdown(url) is None
+    assert stac_handling._get_markdown(url) == "# Title"
+    assert len(session.requests) == 2
+
+
+def test_markdown_prefetch_timeout_does_not_fetch_again(fake_session, monkeypatch):
+    session = fake_session()
+    monkeypatch.setattr(stac_handling, "_MARKDOWN_PREFETCH_TIMEOUT", 0.01)
+    url = "https://assets.example/c.md"
+    # a prefetch request that is still running
+    stac_handling._MARKDOWN_FUTURES[url] = Future()
+    assert stac_handling._get_markdown(url) is None
+    assert session.requests == []
+
+
+def test_markdown_cache_is_written_and_revalidated(fake_session, monkeypatch, tmp_path):
+    monkeypatch.setenv("EODASH_HTTP_CACHE", str(tmp_path))
+    url = "https://assets.example/d.md"
+    fake_session(FakeResponse(200, b"# Cached", {"ETag": '"v1"'}))
+    assert stac_handling._fetch_markdown(url) == "# Cached"
+    with open(stac_handling._get_markdown_cache_path(url)) as f:
+        assert json.load(f) == {"etag": '"v1"', "last_modified": None, "text": "# Cached"}
+    # a later build sends the etag and reuses the cached text on 304
+    session = fake_session(FakeResponse(304))
+    assert stac_handling._fetch_markdown(url) == "# Cached"
+    assert session.requests == [(url, {"If-None-Match": '"v1"'})]
+
+
+def test_corrupt_markdown_cache_is_ignored(fake_session, monkeypatch, tmp_path):
+    monkeypatch.setenv("EODASH_HTTP_CACHE", str(tmp_path))
+    url = "https://assets.example/e.md"
+    with open(stac_handling._get_markdown_cache_path(url), "w") as f:
+        f.write('{"etag": "v1", "te')
+    session = fake_session(FakeResponse(200, b"# Fresh", {"ETag": '"v2"'}))
+    assert stac_handling._fetch_markdown(url) == "# Fresh"
+    # no conditional request is sent without a readable cache entry
+    assert session.requests == [(url, {})]
+    with open(stac_handling._get_markdown_cache_path(url)) as f:
+        assert json.load(f)["etag"] == '"v2"'
+
+
+def test_extra_fields_configured_as_null_are_kept():
+    collection = create_collection()
+    add_extra_fields(
+        collection,
+        {"Themes": None, "Agency": "ESA", "DataSource": {"Spaceborne": {"Sensor": None}}},
+    )
+    assert collection.extra_fields["themes"] is None
+    assert collection.extra_fields["sensor"] is None
+    assert collection.extra_fields["agency"] == "ESA"
+    assert "tags" not in collection.extra_fields
+    assert "locations" not in collection.extra_fields
@@ -0,0 +1,91 @@
+import io
+import os
+import time
+
+import pytest
+from eodash_catalog import thumbnails
+
+from .conftest import FakeResponse
+
+COLLECTION_CONFIG = {"EodashIdentifier": "ID", "Name": "name"}
+THUMBNAIL_URL = "https://thumbnails.example/wms?layers=a&time=2020"
+
+
+@pytest.fixture
+def workdir(monkeypatch, tmp_path):
+    # thumbnails are written relative to the working directory
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    return workdir
+
+
+def requested_urls(session):
+    return [url for url, _ in session.requests]
+
+
+def read_thumbnail(tmp_path):
+    return (tmp_path / "thumbnails" / "ID_name" / "thumbnail.png").read_bytes()
+
+
+def test_cached_thumbnail_is_reused(workdir, fake_session, monkeypatch, tmp_path):
+    monkeypatch.setenv("EODASH_HTTP_CACHE", str(tmp_path / "cache"))
+    session = fake_session()
+    cache_path = thumbnails._get_thumbnail_cache_path(THUMBNAIL_URL)
+    os.makedirs(os.path.dirname(cache_path))
+    with open(cache_path, "wb") as f:
+        f.write(b"cached")
+    # query parameters in a different order map to the same cache entry
+    thumbnails.fetch_and_save_thumbnail(
+        COLLECTION_CONFIG, "https://thumbnails.example/wms?time=2020&layers=a"
+    )
+    assert session.requests == []
+    assert read_thumbnail(tmp_path) == b"cached"
+
+
+def test_expired_thumbnail_is_downloaded_again(workdir, fake_session, monkeypatch, tmp_path):
+    monkeypatch.setenv("EODASH_HTTP_CACHE", str(tmp_path / "cache"))
+    session = fake_session(FakeResponse(200, b"image"))
+    cache_path = thumbnails._get_thumbnail_cache_path(THUMBNAIL_URL)
+    os.makedirs(os.path.dirname(cache_path))
+    with open(cache_path, "wb") as f:
+        f.write(b"cached")
+    expired = time.time() - thumbnails.THUMBNAIL_CACHE_TTL - 1
+    os.utime(cache_path, (expired, expired))
+    thumbnails.fetch_and_save_thumbnail(COLLECTION_CONFIG, THUMBNAIL_URL)
+    assert requested_urls(session) == [THUMBNAIL_URL]
+    assert read_thumbnail(tmp_path) == b"image"
+    # the cache entry is replaced without leaving temporary files behind
+    with open(cache_path, "rb") as f:
+        assert f.read() == b"image"
+    assert os.listdir(os.path.dirname(cache_path)) == [os.path.basename(cache_path)]
+
+
+def test_thumbnail_without_cache(workdir, fake_session, monkeypatch, tmp_path):
+    monkeypatch.delenv("EODASH_HTTP_CACHE", raising=False)
+    session = fake_session(FakeResponse(200, b"image"))
+    assert thumbnails._get_thumbnail_cache_path(THUMBNAIL_URL) is None
+    thumbnails.fetch_and_save_thumbnail(COLLECTION_CONFIG, THUMBNAIL_URL)
+    assert requested_urls(session) == [THUMBNAIL_URL]
+    assert read_thumbnail(tmp_path) == b"image"
+    assert sorted(os.listdir(tmp_path)) == ["thumbnails", "work"]
+
+
+class BrokenStream(io.BytesIO):
+    def read(self, *args):
+        if self.tell() > 0:
+            raise ConnectionError("connection dropped")
+        return super().read(2)
+
+
+def test_interrupted_download_leaves_no_thumbnail(workdir, fake_session, monkeypatch, tmp_path):
+    monkeypatch.delenv("EODASH_HTTP_CACHE", raising=False)
+    broken_response = FakeResponse(200)
+    broken_response.raw = BrokenStream(b"image")
+    fake_session(broken_response, FakeResponse(200, b"image"))
+    with pytest.raises(ConnectionError):
+        thumbnails.fetch_and_save_thumbnail(COLLECTION_CONFIG, THUMBNAIL_URL)
+    assert os.listdir(tmp_path / "thumbnails" / "ID_name") == []
+    # the next build downloads the thumbnail again
+    thumbnails.fetch_and_save_thumbnail(COLLECTION_CONFIG, THUMBNAIL_URL)
+    assert read_thumbnail(tmp_path) == b"image"
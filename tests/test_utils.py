@@ -0,0 +1,193 @@
+import json
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from eodash_catalog import utils
+from eodash_catalog.duration import Duration
+from eodash_catalog.utils import (
+    generateDatetimesFromInterval,
+    get_layer_capabilities_service,
+    getDatetimeBoundsFromInterval,
+    interval,
+    load_capabilities_service,
+    parse_duration,
+    prefetch_capabilities,
+    recursive_save,
+)
+from pystac import (
+    Catalog,
+    Collection,
+    Extent,
+    Item,
+    SpatialExtent,
+    TemporalExtent,
+)
+
+
+def test_interval_with_non_positive_timedelta_is_rejected():
+    for timedelta_config in ({}, {"days": 0}, {"days": -1}):
+        with pytest.raises(ValueError, match="must be positive"):
+            generateDatetimesFromInterval(
+                "2020-01-01T00:00:00Z", "2020-01-03T00:00:00Z", timedelta_config
+            )
+        with pytest.raises(ValueError, match="must be positive"):
+            getDatetimeBoundsFromInterval(
+                "2020-01-01T00:00:00Z", "2020-01-03T00:00:00Z", timedelta_config
+            )
+
+
+class FakeService:
+    def __init__(self, *layers):
+        self.contents = dict.fromkeys(layers)
+
+
+def mock_capabilities(monkeypatch, services):
+    requested = []
+
+    def get_capabilities_service(capabilities_url, version, service_type):
+        requested.append(capabilities_url)
+        service = services[capabilities_url]
+        if isinstance(service, Exception):
+            raise service
+        return service
+
+    monkeypatch.setattr(utils, "get_capabilities_service", get_capabilities_service)
+    return requested
+
+
+CAPABILITIES_REQUEST = ("https://wms.example", "1.1.1", "WMS", None)
+
+
+def mock_load_capabilities(monkeypatch):
+    loaded = []
+
+    def load_capabilities_service(capabilities_url, version, service_type, layer=None):
+        loaded.append((capabilities_url, version, service_type, layer))
+        return FakeService("a")
+
+    monkeypatch.setattr(utils, "_load_capabilities_service", load_capabilities_service)
+    return loaded
+
+
+def test_prefetched_capabilities_are_loaded_once(monkeypatch):
+    loaded = mock_load_capabilities(monkeypatch)
+    futures: utils.CapabilitiesFutures = {}
+    prefetch_capabilities([CAPABILITIES_REQUEST, CAPABILITIES_REQUEST], futures)
+    service = load_capabilities_service(*CAPABILITIES_REQUEST, futures=futures)
+    assert "a" in service.contents
+    # collections sharing the endpoint reuse the prefetched document
+    assert load_capabilities_service(*CAPABILITIES_REQUEST, futures=futures) is service
+    assert loaded == [CAPABILITIES_REQUEST]
+
+
+def test_failed_capabilities_prefetch_falls_back_to_loading(monkeypatch):
+    loaded = mock_load_capabilities(monkeypatch)
+    failed: Future = Future()
+    failed.set_exception(ConnectionError("timeout"))
+    futures: utils.CapabilitiesFutures = {CAPABILITIES_REQUEST: failed}
+    service = load_capabilities_service(*CAPABILITIES_REQUEST, futures=futures)
+    assert loaded == [CAPABILITIES_REQUEST]
+    assert futures[CAPABILITIES_REQUEST].result() is service
+
+
+def test_layer_capabilities_are_requested_for_the_layer(monkeypatch):
+    filtered = FakeService("a layer")
+    requested = mock_capabilities(monkeypatch, {"https://wms.example?LAYERS=a%20layer": filtered})
+    service = get_layer_capabilities_service("https://wms.example", "a layer", "1.1.1", "WMS")
+    assert service is filtered
+    assert requested == ["https://wms.example?LAYERS=a%20layer"]
+
+
+def test_layer_capabilities_fall_back_to_full_document(monkeypatch):
+    full = FakeService("a", "b")
+    for filtered in (FakeService("b"), ValueError("LAYERS not supported")):
+        requested = mock_capabilities(
+            monkeypatch,
+            {"https://wms.example?map=x&LAYERS=a": filtered, "https://wms.example?map=x": full},
+        )
+        service = get_layer_capabilities_service("https://wms.example?map=x", "a", "1.1.1", "WMS")
+        assert service is full
+        assert requested == ["https://wms.example?map=x&LAYERS=a", "https://wms.example?map=x"]
+
+
+def stepwise_interval(start, stop, delta):
+    # reference implementation adding the delta step by step
+    while start <= stop:
+        yield start
+        start += delta
+    yield stop
+
+
+def test_interval_matches_stepwise_iteration():
+    start = datetime(2020, 1, 31, tzinfo=timezone.utc)
+    for stop, delta in (
+        # the last step ends exactly on stop
+        (datetime(2020, 1, 31, 12, tzinfo=timezone.utc), timedelta(hours=3)),
+        # a partial final step, stop is appended after the last full step
+        (datetime(2020, 3, 2, 5, tzinfo=timezone.utc), timedelta(days=1, minutes=13)),
+        (datetime(2020, 2, 1, tzinfo=timezone.utc), timedelta(seconds=0.25)),
+        # stop before the first step
+        (datetime(2020, 1, 31, 1, tzinfo=timezone.utc), timedelta(days=1)),
+        # month durations are added calendar based
+        (datetime(2021, 1, 1, tzinfo=timezone.utc), Duration(months=1)),
+        (datetime(2024, 3, 1, tzinfo=timezone.utc), Duration(years=1, days=2)),
+    ):
+        expected = list(stepwise_interval(start, stop, delta))
+        assert list(interval(start, stop, delta)) == expected
+        assert expected[-1] == stop
+
+
+def test_parse_duration():
+    assert parse_duration("P1D") == timedelta(days=1)
+    assert parse_duration("P1W") == timedelta(weeks=1)
+    assert parse_duration("-PT6H") == timedelta(hours=-6)
+    # fractional values with either decimal separator
+    assert parse_duration("PT1.5H") == timedelta(minutes=90)
+    assert parse_duration("P0,5D") == timedelta(hours=12)
+    assert parse_duration("P1Y2M3DT4H") == Duration(years=1, months=2, days=3, hours=4)
+    assert parse_duration("-P1M") == Duration(months=-1)
+    assert datetime(2020, 3, 31) + parse_duration("-P1M") == datetime(2020, 2, 29)
+    fractional_months = parse_duration("P1.5M")
+    assert fractional_months.months == Decimal("1.5")
+    with pytest.raises(ValueError, match="fractional"):
+        datetime(2020, 1, 1) + fractional_months
+    with pytest.raises(TypeError):
+        parse_duration(1)
+
+
+def test_parse_duration_is_cached():
+    first = parse_duration("P1M")
+    hits = parse_duration.cache_info().hits
+    assert parse_duration("P1M") == first
+    assert parse_duration.cache_info().hits == hits + 1
+
+
+def make_collection(collection_id):
+    extent = Extent(SpatialExtent([[-180, -90, 180, 90]]), TemporalExtent([[None, None]]))
+    return Collection(id=collection_id, description=collection_id, extent=extent)
+
+
+def test_recursive_save_without_items(tmp_path):
+    catalog = Catalog(id="catalog", description="catalog")
+    for i in range(3):
+        collection = make_collection(f"collection{i}")
+        for j in range(3):
+            subcollection = make_collection(f"collection{i}-{j}")
+            subcollection.add_item(Item(f"item{i}-{j}", None, None, datetime(2020, 1, 1), {}))
+            collection.add_child(subcollection)
+        catalog.add_child(collection)
+    catalog.normalize_hrefs(str(tmp_path))
+    # few workers, so writes are queued while the tree is walked
+    recursive_save(catalog, no_items=True, max_workers=2)
+    saved = {
+        path.relative_to(tmp_path).as_posix(): json.loads(path.read_text())
+        for path in tmp_path.rglob("*.json")
+    }
+    expected = {"catalog.json": "catalog"}
+    for i in range(3):
+        expected[f"collection{i}/collection.json"] = f"collection{i}"
+        for j in range(3):
+            expected[f"collection{i}/collection{i}-{j}/collection.json"] = f"collection{i}-{j}"
+    assert {path: stac_object["id"] for path, stac_object in saved.items()} == expected